@@ -1,6 +1,9 @@
-import json
-import os
-import time
+import asyncio
+import re
+from tempfile import SpooledTemporaryFile
+from typing import BinaryIO, Optional, Tuple
+
+import orjson
 from loguru import logger
 from telegram import (
     CallbackQuery,
@@ -11,17 +14,58 @@ from telegram import (
 from telegram.ext import ContextTypes
 
 import app.constants.strings as strings
-from app.bot.utils import BotWrapper, auth_required, args_required
+from app.bot import user_cache
+from app.bot.utils import (
+    BotWrapper,
+    auth_required,
+    callback_handler,
+    callback_with_user,
+    get_current_user,
+)
 from app.constants import AccessLevel, DatabaseKeys
-from app.constants.defaults import DEFAULT_ACCESS_LEVEL, RATE_LIMIT_PAUSE
+from app.constants.defaults import (
+    ADMIN_IDS_CACHE_TTL,
+    ADMIN_VIEWS_CACHE_TTL,
+    DEFAULT_ACCESS_LEVEL,
+    DUMP_SPOOL_MAX_SIZE,
+    PLACEHOLDER_DELAY,
+    STREAM_BOUNDARY_MAX_WAIT,
+    STREAM_EDIT_DELAYS,
+    STREAM_EDIT_MAX_DELAY,
+    STREAM_FLUSH_BOUNDARIES,
+    STREAM_FLUSH_SIZE,
+    STREAM_MIN_EDIT_SIZE,
+    RateLimits,
+)
 from app.constants.models import AvailableModels
-from app.constants.paths import TMP_FILE_NAME
+from app.constants.paths import DUMP_FILE_NAME
 from app.database import Database
+from app.database.utils import count_questions
 from app.model import LanguageModel
-from app.startup import TELEGRAM_BOT_TOKEN
-from app.utils import get_user_string
+from app.startup import MODEL_MAX_CONCURRENT_REQUESTS, TELEGRAM_BOT_TOKEN
+from app.utils import get_user_string, log_user_action, parse_user_id, ttl_cache
 
 bot = BotWrapper(TELEGRAM_BOT_TOKEN)
+database = Database()
+language_model = LanguageModel()
+
+# Limits the number of responses generated at once, so that concurrent streams
+# don't starve each other; further messages wait for a free slot
+model_semaphore = asyncio.Semaphore(MODEL_MAX_CONCURRENT_REQUESTS)
+
+# Callback data parsers, compiled once instead of splitting the data in every handler
+CHOOSE_MODEL_DATA = re.compile(r"^choose_model:(.+)$")
+CHOOSE_ACCESS_LEVEL_DATA = re.compile(r"^choose_access_level (?:ID)?(\d+)$")
+CHANGE_ACCESS_LEVEL_CONFIRM_DATA = re.compile(
+    r"^change_access_level_confirm (?:ID)?(\d+) (\d+)$"
+)
+FORWARD_REQUESTS_DATA = re.compile(r"^forward_requests (?:ID)?(\d+)$")
+
+# (name, level) pairs of the access level buttons, access levels are fixed
+ACCESS_LEVEL_BUTTONS = tuple(
+    (AccessLevel.from_int(access_level=level, locale="ru"), level)
+    for level in AccessLevel.all()
+)
 
 
 @bot.handler_for("start")
@@ -31,7 +75,7 @@ async def start(update: Update, _: ContextTypes.DEFAULT_TYPE):
     Handle the /start command.
     """
 
-    logger.debug(f"User {get_user_string(update)} used /start command")
+    log_user_action(update, "/start command")
 
     await update.message.reply_text(strings.MSG_WELCOME)
 
@@ -42,11 +86,32 @@ async def unknown_command(update: Update, _: ContextTypes.DEFAULT_TYPE):
     Handle unknown commands.
     """
 
-    logger.debug(f"User {get_user_string(update)} used unknown command")
+    log_user_action(update, "unknown command")
 
     await update.message.reply_text(strings.MSG_UNKNOWN_COMMAND)
 
 
+@ttl_cache(ttl=ADMIN_IDS_CACHE_TTL)
+def get_admin_ids() -> Tuple[int, ...]:
+    """
+    Get the IDs of all admins, caching them so that a burst of errors does
+    not scan the whole users table for every error.
+
+    Returns:
+        The IDs of the admins.
+    """
+
+    response = database.get_users()
+    if not response.success:
+        return ()
+
+    return tuple(
+        user.get(DatabaseKeys.User.ID)
+        for user in response.data.values()
+        if user.get(DatabaseKeys.User.ACCESS_LEVEL) == AccessLevel.ADMIN
+    )
+
+
 @bot.error_handler()
 async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
@@ -64,21 +129,17 @@ async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.error(f"Failed to connect to Telegram servers: {e}")
         return
 
-    admin_chat_ids = []
-    response = Database().get_users()
-    if response.success:
-        users = response.data
-        for user in users.values():
-            if user.get(DatabaseKeys.User.ACCESS_LEVEL) == AccessLevel.ADMIN:
-                admin_chat_ids.append(user.get(DatabaseKeys.User.ID))
+    admin_chat_ids = await asyncio.to_thread(get_admin_ids)
 
     try:
+        user = update.effective_user
+        message = update.message
         error_message = (
             f"An error occurred:\n\n"
             f"Update ID: {update.update_id}\n"
-            f"User: {update.effective_user.first_name} (ID: {update.effective_user.id})\n"
-            f"Message: '{update.message.text}'\n"
-            f"Date: {update.message.date}\n\n"
+            f"User: {user.first_name} (ID: {user.id})\n"
+            f"Message: '{message.text}'\n"
+            f"Date: {message.date}\n\n"
             f"Error: {error}"
         )
     except Exception:
@@ -86,12 +147,16 @@ async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             "An error occurred:\n\n" f"Update\n{str(update)}\n" f"Error\n{error}"
         )
 
-    for admin_id in admin_chat_ids:
+    send_message = context.bot.send_message
+
+    async def notify(admin_id: int):
         try:
-            await context.bot.send_message(chat_id=admin_id, text=error_message)
+            await send_message(chat_id=admin_id, text=error_message)
         except Exception as e:
             logger.error(f"Failed to notify admin {admin_id}: {e}")
 
+    await asyncio.gather(*(notify(admin_id) for admin_id in admin_chat_ids))
+
 
 @bot.handler_for("raise_error")
 @auth_required(min_level=AccessLevel.ADMIN)
@@ -102,6 +167,52 @@ async def raise_error(update: Update, _: ContextTypes.DEFAULT_TYPE):
     raise Exception("This is a test error")
 
 
+def dump_record(user_id, user_data: dict) -> dict:
+    """
+    Build the dump record of a single user.
+
+    Args:
+        user_id: The ID of the user.
+        user_data: The user data dictionary.
+
+    Returns:
+        The dictionary to be written into the dump.
+    """
+    get = user_data.get
+    return {
+        "id": user_id,
+        "first_name": get("first_name"),
+        "last_name": get("last_name"),
+        "username": get("username"),
+        "access_level": AccessLevel.from_int(
+            locale=get(DatabaseKeys.User.LANGUAGE_CODE),
+            access_level=get(DatabaseKeys.User.ACCESS_LEVEL),
+        ),
+        "conversation": get("conversation"),
+    }
+
+
+def write_users_dump(users: dict, file: BinaryIO) -> None:
+    """
+    Write users into a JSON array one record at a time, so only a single
+    serialized record is held in memory at once.
+
+    Args:
+        users: A dictionary mapping user IDs to user data dictionaries.
+        file: The binary file object to write into.
+    """
+    write = file.write
+    dumps = orjson.dumps
+
+    write(b"[")
+    for index, (user_id, user_data) in enumerate(users.items()):
+        if index:
+            write(b",")
+        write(dumps(dump_record(user_id, user_data)))
+    write(b"]")
+    file.seek(0)
+
+
 @bot.handler_for("dump")
 @auth_required(min_level=AccessLevel.ADMIN)
 async def dump(update: Update, _: ContextTypes.DEFAULT_TYPE):
@@ -109,95 +220,185 @@ async def dump(update: Update, _: ContextTypes.DEFAULT_TYPE):
     Handle the /dump command.
     Dumps all user data into a JSON file and sends it as a document.
     """
-    logger.debug(f"User {get_user_string(update)} used /dump command")
+    log_user_action(update, "/dump command")
 
-    response = Database().get_users()
+    response = await asyncio.to_thread(database.get_users)
     if not response.success:
         await update.message.reply_text(strings.MSG_NO_USERS)
         return
 
-    users = response.data
-
-    dump_data = [
-        {
-            "id": user_id,
-            "first_name": user_data.get("first_name"),
-            "last_name": user_data.get("last_name"),
-            "username": user_data.get("username"),
-            "access_level": AccessLevel.from_int(
-                locale=user_data.get(DatabaseKeys.User.LANGUAGE_CODE),
-                access_level=user_data.get(DatabaseKeys.User.ACCESS_LEVEL),
-            ),
-            "conversation": user_data.get("conversation"),
-        }
-        for user_id, user_data in users.items()
-    ]
-
     try:
-        with open(TMP_FILE_NAME, "w", encoding="utf-8") as temp_file:
-            json.dump(dump_data, temp_file, indent=4, ensure_ascii=False)
-
-        with open(TMP_FILE_NAME, "rb") as file:
-            await update.message.reply_document(file, filename=TMP_FILE_NAME)
+        # Kept in memory unless the dump outgrows DUMP_SPOOL_MAX_SIZE
+        with SpooledTemporaryFile(max_size=DUMP_SPOOL_MAX_SIZE) as file:
+            await asyncio.to_thread(write_users_dump, response.data, file)
+            await update.message.reply_document(file, filename=DUMP_FILE_NAME)
     except Exception as e:
         logger.error(f"Failed to send user dump: {e}")
         await update.message.reply_text("Failed to generate user dump.")
-    finally:
-        if os.path.exists(TMP_FILE_NAME):
-            os.remove(TMP_FILE_NAME)
+
+
+def edit_delay(response_length: int) -> float:
+    """
+    Get the delay before the next edit of a streamed response.
+
+    Short responses are edited often so the first words show up quickly, long
+    ones less often, since every edit resends the whole text. All delays scale
+    with the pause set by admins, which is the delay of the longest responses.
+
+    Args:
+        response_length: Length of the response streamed so far.
+
+    Returns:
+        Delay in seconds.
+    """
+    pause = RateLimits.stream_edit_pause
+    for max_length, delay in STREAM_EDIT_DELAYS:
+        if response_length <= max_length:
+            return delay * pause / STREAM_EDIT_MAX_DELAY
+    return pause
 
 
 @bot.text_handler()
 @auth_required(min_level=AccessLevel.USER)
-async def text_handler(update: Update, _: ContextTypes.DEFAULT_TYPE):
+async def text_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     Handle text messages and use the Provider to generate a response.
     """
 
-    logger.info(
-        f"Received message from {get_user_string(update)}: {update.message.text}"
+    reply_text = update.message.reply_text
+    message_text = update.message.text
+    logger.opt(lazy=True).info(
+        "Received message from {}: {}",
+        lambda: get_user_string(update),
+        lambda: message_text,
     )
 
-    response = Database().get_user_by_update(update)
+    response = await get_current_user(update, context)
 
     if not response.success:
-        await update.message.reply_text(strings.MSG_USER_NOT_FOUND)
+        await reply_text(strings.MSG_USER_NOT_FOUND)
         return
 
     user = response.data
 
-    placeholder_message = await update.message.reply_text(
-        strings.MSG_WAITING_FOR_RESPONSE
-    )
-
-    full_response = ""
-    last_response = ""
-    rate_limit = time.time() + RATE_LIMIT_PAUSE
-
-    async for chunk in LanguageModel().stream_answer(update.message.text, user):
-        full_response += chunk
-
-        if full_response.strip() == last_response.strip() or time.time() < rate_limit:
-            continue
+    loop = asyncio.get_running_loop()
+    parts = []
+    response_length = 0
+    pending_length = 0
+    flushed_parts = 0
+    edit_task = None
+    next_flush = loop.time()
+
+    # The response message is created by the first chunk; the waiting placeholder
+    # is only sent if the model takes longer than PLACEHOLDER_DELAY to get there
+    message_task = None
+
+    def send_placeholder():
+        nonlocal message_task
+        if message_task is None:
+            message_task = asyncio.create_task(
+                reply_text(strings.MSG_WAITING_FOR_RESPONSE)
+            )
 
-        rate_limit = time.time() + RATE_LIMIT_PAUSE
+    placeholder_timer = loop.call_later(PLACEHOLDER_DELAY, send_placeholder)
+
+    async def send_or_edit(text: str):
+        nonlocal message_task
+        # Send a new message if sending the previous one failed
+        if (
+            message_task is not None
+            and message_task.done()
+            and message_task.exception()
+        ):
+            message_task = None
+
+        if message_task is None:
+            placeholder_timer.cancel()
+            message_task = asyncio.create_task(reply_text(text))
+            await message_task
+        else:
+            message = await message_task
+            await message.edit_text(text)
 
+    async def flush(text: str, parts_count: int):
+        nonlocal flushed_parts
         try:
-            await placeholder_message.edit_text(full_response)
-            last_response = full_response
+            await send_or_edit(text)
+            flushed_parts = parts_count
         except Exception as e:
             logger.error(f"Error while editing message: {e}")
 
-    if not full_response:
+    try:
+        async with model_semaphore:
+            async for chunk in language_model.stream_answer(message_text, user):
+                parts.append(chunk)
+                response_length += len(chunk)
+                pending_length += len(chunk)
+
+                # Edits run in the background so the stream is never blocked by Telegram;
+                # chunks arriving meanwhile are coalesced into the next edit
+                if edit_task is not None and not edit_task.done():
+                    continue
+
+                if pending_length < STREAM_MIN_EDIT_SIZE:
+                    continue
+
+                # Prefer cutting at word boundaries so words don't show up half-typed
+                if (
+                    not chunk.endswith(STREAM_FLUSH_BOUNDARIES)
+                    and pending_length < STREAM_BOUNDARY_MAX_WAIT
+                ):
+                    continue
+
+                now = loop.time()
+                if pending_length < STREAM_FLUSH_SIZE and now < next_flush:
+                    continue
+
+                text = "".join(parts)
+                if not text.strip():
+                    continue
+
+                next_flush = now + edit_delay(response_length)
+                pending_length = 0
+                edit_task = asyncio.create_task(flush(text, len(parts)))
+    finally:
+        # Cleaned up even if the model fails, so the placeholder isn't sent after
+        # the error and the stored conversation isn't served from the cache
+        placeholder_timer.cancel()
+        user_cache.invalidate(update.effective_user.id)
+        if edit_task is not None:
+            await edit_task
+
+    full_response = "".join(parts)
+    if not full_response.strip():
         logger.error("Got empty response from model")
-    else:
-        logger.info(f"Response:\n{full_response}")
-        try:
-            if full_response != last_response:
-                await placeholder_message.edit_text(full_response)
-        except Exception as e:
-            if "Message is not modified" not in str(e):
-                logger.error(f"Error while editing final message: {e}")
+        return
+
+    logger.opt(lazy=True).info("Response:\n{}", lambda: full_response)
+    if len(parts) != flushed_parts:
+        await flush(full_response, len(parts))
+
+
+@ttl_cache(ttl=ADMIN_VIEWS_CACHE_TTL)
+def render_users_list() -> Optional[str]:
+    """
+    Render the list of all users, caching the result for a short time so that
+    repeated /users calls do not hit the database.
+
+    Returns:
+        The rendered list or None if there are no users.
+    """
+
+    response = database.get_users()
+
+    if not response.success or not response.data:
+        return None
+
+    return "\n".join(
+        f"{user.get('first_name') or ''} {user.get('last_name') or '---'} "
+        f"\"{user.get('username') or ''}\" (ID{user.get('id')})"
+        for user in response.data.values()
+    )
 
 
 @bot.handler_for("users")
@@ -207,42 +408,27 @@ async def get_users(update: Update, context: ContextTypes.DEFAULT_TYPE):
     Handle the /users command.
     """
 
-    logger.debug(f"User {get_user_string(update)} used /users command")
+    log_user_action(update, "/users command")
 
-    response = Database().get_users()
+    users = await asyncio.to_thread(render_users_list)
 
-    if not response.success:
+    if not users:
         await update.message.reply_text(strings.MSG_NO_USERS)
         return
 
-    users = response.data
-
-    users = [
-        f"{user.get('first_name')} {user.get('last_name', '---')} \"{user.get('username', '')}\" (ID{user.get('id')})"
-        for user in users.values()
-    ]
-    users = "\n".join(users)
-
     await update.message.reply_text(users)
 
 
-@bot.handler_for("model")
-@auth_required(min_level=AccessLevel.USER)
-async def choose_model(update: Update, context: ContextTypes.DEFAULT_TYPE):
+def build_model_keyboard(access_level: int) -> InlineKeyboardMarkup:
     """
-    Handle the /model command.
-    """
-
-    logger.debug(f"User {get_user_string(update)} used /model command")
+    Build the model selection keyboard for an access level.
 
-    response = Database().get_user_by_update(update)
-
-    if not response.success:
-        await update.message.reply_text(strings.MSG_USER_NOT_FOUND)
-        return
-
-    user = response.data
+    Args:
+        access_level: Access level of the user.
 
+    Returns:
+        Keyboard with a button for every available model and a cancel button.
+    """
     keyboard = [
         [
             InlineKeyboardButton(
@@ -250,9 +436,7 @@ async def choose_model(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 callback_data=f"choose_model:{model.name}",
             )
         ]
-        for model in AvailableModels.filter_by_access_level(
-            user.get(DatabaseKeys.User.ACCESS_LEVEL, DEFAULT_ACCESS_LEVEL)
-        )
+        for model in AvailableModels.filter_by_access_level(access_level)
     ]
     keyboard.append(
         [
@@ -262,79 +446,84 @@ async def choose_model(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
         ]
     )
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    return InlineKeyboardMarkup(keyboard)
 
-    await update.message.reply_text(strings.MSG_CHOOSE_MODEL, reply_markup=reply_markup)
 
+# The set of access levels is small and fixed, so every keyboard is built once
+MODEL_KEYBOARDS = {level: build_model_keyboard(level) for level in AccessLevel.all()}
 
-@bot.callback_for("cancel")
+
+@bot.handler_for("model")
 @auth_required(min_level=AccessLevel.USER)
-async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def choose_model(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
-    Handle the cancel button.
+    Handle the /model command.
     """
 
-    logger.debug(f"User {get_user_string(update)} used cancel button")
+    log_user_action(update, "/model command")
 
-    await update.callback_query.answer()
-    await update.callback_query.message.edit_text(strings.MSG_CANCELLED)
+    response = await get_current_user(update, context)
 
+    if not response.success:
+        await update.message.reply_text(strings.MSG_USER_NOT_FOUND)
+        return
 
-# @bot.handler_for("users")
-# @auth_required(min_level=AccessLevel.ADMIN)
-# async def get_users(update: Update, context: ContextTypes.DEFAULT_TYPE):
-#     """
-#     Handle the /users command.
-#     """
+    user = response.data
 
-#     logger.debug(f"User {get_user_string(update)} used /users command")
+    access_level = user.get(DatabaseKeys.User.ACCESS_LEVEL, DEFAULT_ACCESS_LEVEL)
+    reply_markup = MODEL_KEYBOARDS.get(access_level) or build_model_keyboard(
+        access_level
+    )
 
-#     response = Database().get_users()
+    await update.message.reply_text(strings.MSG_CHOOSE_MODEL, reply_markup=reply_markup)
 
-#     if not response.success:
-#         await update.message.reply_text(strings.MSG_NO_USERS)
-#         return
 
-#     users = response.data
+@bot.callback_for("cancel")
+@auth_required(min_level=AccessLevel.USER)
+async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Handle the cancel button.
+    """
 
-#     users = [
-#         f"{user.get('first_name')} {user.get('last_name') if user.get('last_name') else '---'} \"{user.get('username')}\" (ID{user.get('id')})"
-#         for user in users.values()
-#     ]
-#     users = "\n".join(users)
+    log_user_action(update, "cancel button")
 
-#     await update.message.reply_text(users)
+    await update.callback_query.answer()
+    await update.callback_query.message.edit_text(strings.MSG_CANCELLED)
 
 
 @bot.callback_for("choose_model")
 @auth_required(min_level=AccessLevel.USER)
-async def choose_model_callback(update: Update, _: ContextTypes.DEFAULT_TYPE):
+async def choose_model_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     Handle the /model callback.
     """
 
-    logger.debug(f"User {get_user_string(update)} used /model callback")
+    log_user_action(update, "/model callback")
 
     query = update.callback_query
     await query.answer()
 
-    response = Database().get_user_by_update(update)
+    response = await get_current_user(update, context)
 
     if not response.success:
         await query.answer(strings.MSG_USER_NOT_FOUND, show_alert=True)
         return
 
     user = response.data
-    model_name = query.data.split(":")[1]
-
-    chosen_model = next(
-        (model for model in AvailableModels.ALL() if model.name == model_name), None
-    )
-
-    if chosen_model:
-        user[DatabaseKeys.User.CHOSEN_MODEL] = model_name
 
-        response = Database().update_user_by_id(user.get("id"), user)
+    match = CHOOSE_MODEL_DATA.match(query.data)
+    model_name = match.group(1) if match else None
+    chosen_model = AvailableModels.BY_NAME.get(model_name)
+
+    if chosen_model and chosen_model.min_access_level <= user.get(
+        DatabaseKeys.User.ACCESS_LEVEL, DEFAULT_ACCESS_LEVEL
+    ):
+        response = await asyncio.to_thread(
+            database.patch_user,
+            user.get(DatabaseKeys.User.ID),
+            {DatabaseKeys.User.CHOSEN_MODEL: model_name},
+        )
+        user_cache.invalidate(user.get(DatabaseKeys.User.ID))
 
         if response.success:
             await query.edit_message_text(strings.MSG_MODEL_CHOSEN.format(model_name))
@@ -351,10 +540,10 @@ async def state(update: Update, context: ContextTypes.DEFAULT_TYPE):
     Handle the /state command.
     """
 
-    logger.debug(f"User {get_user_string(update)} used /state command")
+    log_user_action(update, "/state command")
 
     await update.message.reply_text(
-        strings.MSG_STATE.format(LanguageModel().stability_percentage())
+        strings.MSG_STATE.format(language_model.stability_percentage())
     )
 
 
@@ -365,24 +554,23 @@ async def rate_limit_pause(update: Update, context: ContextTypes.DEFAULT_TYPE):
     Handle the /rate_limit_pause command.
     """
 
-    logger.debug(f"User {get_user_string(update)} used /rate_limit_pause command")
+    log_user_action(update, "/rate_limit_pause command")
 
     if not context.args:
         await update.message.reply_text("Usage: /set_rate_limit_pause <seconds>")
         return
 
     try:
-        rate_limit_pause = int(context.args[0])
+        rate_limit_pause = float(context.args[0])
 
         if rate_limit_pause <= 0:
             raise ValueError
+
+        rate_limit_pause = RateLimits.set_stream_edit_pause(rate_limit_pause)
     except ValueError:
         await update.message.reply_text(strings.MSG_INVALID_RATE_LIMIT_PAUSE)
         return
 
-    global RATE_LIMIT_PAUSE
-    RATE_LIMIT_PAUSE = rate_limit_pause
-
     await update.message.reply_text(
         strings.MSG_RATE_LIMIT_PAUSE_SET.format(rate_limit_pause)
     )
@@ -395,52 +583,24 @@ async def admin_commands(update: Update, context: ContextTypes.DEFAULT_TYPE):
     Handle the /admin_commands command.
     """
 
-    logger.debug(f"User {get_user_string(update)} used /admin_commands command")
+    log_user_action(update, "/admin_commands command")
 
-    commands = [
-        "/set_rate_limit_pause <seconds>",
-        "/user <user_id>",
-        "/users",
-        "/delete_user <user_id>",
-        "/dump",
-    ]
+    await update.message.reply_text(strings.MSG_ADMIN_COMMANDS)
 
-    commands = "\n".join(commands)
 
-    await update.message.reply_text(commands)
-
-
-@bot.handler_for("user")
-@auth_required(min_level=AccessLevel.ADMIN)
-async def get_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """
-    Handle the /user command.
+def render_user_card(user: dict) -> Tuple[str, InlineKeyboardMarkup]:
     """
+    Render the user information message and its management keyboard.
 
-    logger.debug(f"User {get_user_string(update)} used /user command")
-
-    if not context.args:
-        await update.message.reply_text(strings.MSG_NO_USER_ID)
-        return
-
-    user_id = context.args[0]
-    if user_id.startswith("ID"):
-        user_id = user_id[2:]
-
-    response = Database().get_user(user_id)
-
-    if not response.success:
-        await update.message.reply_text(strings.MSG_USER_NOT_FOUND)
-        return
-
-    user = response.data
+    Args:
+        user: The user data dictionary.
 
-    conversation = user.get("conversation")
+    Returns:
+        A tuple of the message text and the inline keyboard.
+    """
 
-    questions_count = 0
-    for message in conversation:
-        if message.get("role") == "user":
-            questions_count += 1
+    user_id = user.get("id")
+    questions_count = count_questions(user)
 
     message = [
         f"ID: {user.get('id')}",
@@ -473,30 +633,98 @@ async def get_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
     ]
     keyboard = InlineKeyboardMarkup(buttons)
 
+    return message, keyboard
+
+
+@ttl_cache(ttl=ADMIN_VIEWS_CACHE_TTL, maxsize=32)
+def get_user_card(user_id: int) -> Optional[Tuple[str, InlineKeyboardMarkup]]:
+    """
+    Fetch a user and render their card, caching the result for a short time.
+
+    Args:
+        user_id: The ID of the user.
+
+    Returns:
+        The result of :func:`render_user_card` or None if the user was not found.
+    """
+
+    response = database.get_user(user_id)
+
+    if not response.success:
+        return None
+
+    return render_user_card(response.data)
+
+
+def invalidate_admin_views():
+    """
+    Drop cached admin views after user data was changed by an admin.
+    """
+
+    render_users_list.cache_clear()
+    get_user_card.cache_clear()
+    get_admin_ids.cache_clear()
+
+
+@bot.handler_for("user")
+@auth_required(min_level=AccessLevel.ADMIN)
+async def get_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Handle the /user command.
+    """
+
+    log_user_action(update, "/user command")
+
+    reply_text = update.message.reply_text
+    args = context.args
+
+    if not args:
+        await reply_text(strings.MSG_NO_USER_ID)
+        return
+
+    try:
+        user_id = parse_user_id(args[0])
+    except ValueError:
+        await reply_text(strings.MSG_INVALID_INPUT)
+        return
+
+    user_card = await asyncio.to_thread(get_user_card, user_id)
+
+    if not user_card:
+        await reply_text(strings.MSG_USER_NOT_FOUND)
+        return
+
+    message, keyboard = user_card
+
     await context.bot.send_message(
         chat_id=update.effective_chat.id, text=message, reply_markup=keyboard
     )
 
 
-@bot.handler_for("delete_user")
-@auth_required(min_level=AccessLevel.ADMIN, verbose=False)
-@args_required(exact_arguments=2, error_message=strings.MSG_NO_USER_ID)
-async def delete_user(update: Update, args: list, query: CallbackQuery):
+@bot.callback_for("delete_user")
+@callback_handler(
+    min_level=AccessLevel.ADMIN, exact_arguments=2, error_message=strings.MSG_NO_USER_ID
+)
+async def delete_user(update: Update, args: tuple, query: CallbackQuery):
     """
-    Handle the /delete_user command.
+    Handle the delete user button.
     """
 
-    logger.debug(f"User {get_user_string(update)} used /delete_user command")
-
-    user_id = args[1]
+    log_user_action(update, "delete user button")
 
-    if user_id.startswith("ID"):
-        user_id = int(user_id[2:])
+    try:
+        user_id = parse_user_id(args[1])
+    except ValueError:
+        await query.edit_message_text(strings.MSG_INVALID_INPUT)
+        return
 
-    if not Database().delete_user(user_id).success:
+    if not (await asyncio.to_thread(database.delete_user, user_id)).success:
         await query.edit_message_text(strings.MSG_USER_NOT_FOUND)
         return
 
+    user_cache.invalidate(user_id)
+    invalidate_admin_views()
+
     await query.edit_message_text(strings.MSG_USER_DELETED)
 
 
@@ -507,33 +735,27 @@ async def choose_access_level(update: Update, context: ContextTypes.DEFAULT_TYPE
     Handle the /choose_access_level command.
     """
 
-    logger.debug(f"User {get_user_string(update)} used /choose_access_level command")
+    log_user_action(update, "/choose_access_level command")
 
     query = update.callback_query
     await query.answer()
 
-    args = query.data.split(" ")
-    logger.debug(f"Args: {args}")
-    if len(args) != 2:
+    match = CHOOSE_ACCESS_LEVEL_DATA.match(query.data)
+    if not match:
         await query.edit_message_text(strings.MSG_NO_USER_ID)
         return
 
-    user_id = args[1]
-
-    if user_id.startswith("ID"):
-        user_id = int(user_id[2:])
-
-    buttons = []
+    user_id = int(match.group(1))
 
-    for access_level in AccessLevel.all():
-        buttons.append(
-            [
-                InlineKeyboardButton(
-                    text=AccessLevel.from_int(access_level=access_level, locale="ru"),
-                    callback_data=f"change_access_level_confirm {user_id} {access_level}",
-                )
-            ]
-        )
+    buttons = [
+        [
+            InlineKeyboardButton(
+                text=name,
+                callback_data=f"change_access_level_confirm {user_id} {level}",
+            )
+        ]
+        for name, level in ACCESS_LEVEL_BUTTONS
+    ]
 
     keyboard = InlineKeyboardMarkup(buttons)
 
@@ -544,95 +766,69 @@ async def choose_access_level(update: Update, context: ContextTypes.DEFAULT_TYPE
 
 @bot.callback_for("change_access_level_confirm")
 @auth_required(min_level=AccessLevel.ADMIN, verbose=False)
+@callback_with_user(
+    CHANGE_ACCESS_LEVEL_CONFIRM_DATA, error_message=strings.MSG_INVALID_INPUT
+)
 async def change_access_level_confirm(
-    update: Update, context: ContextTypes.DEFAULT_TYPE
+    update: Update,
+    context: ContextTypes.DEFAULT_TYPE,
+    query: CallbackQuery,
+    user: dict,
+    access_level: str,
 ):
     """
     Handle the /change_access_level_confirm command.
     """
 
-    logger.debug(
-        f"User {get_user_string(update)} used /change_access_level_confirm command"
-    )
+    log_user_action(update, "/change_access_level_confirm command")
 
-    query = update.callback_query
-    await query.answer()
-
-    args = query.data.split(" ")
-    logger.debug(f"Args: {args}")
-    if len(args) != 3:
-        await query.edit_message_text(strings.MSG_NO_USER_ID)
-        return
-
-    user_id = args[1]
-    access_level = args[2]
-
-    try:
-        user_id = int(user_id)
-        access_level = int(access_level)
-    except ValueError:
-        await query.edit_message_text(strings.MSG_INVALID_INPUT)
-        return
-
-    response = Database().get_user(user_id)
-
-    if not response.success:
-        await query.edit_message_text(strings.MSG_USER_NOT_FOUND)
-        return
-
-    user = response.data
+    user_id = user.get(DatabaseKeys.User.ID)
+    access_level = int(access_level)
 
     if access_level not in AccessLevel.all():
         await query.edit_message_text(strings.MSG_INVALID_ACCESS_LEVEL)
         return
 
-    user[DatabaseKeys.User.ACCESS_LEVEL] = access_level
-    update_response = Database().update_user_by_id(user_id, user)
+    update_response = await asyncio.to_thread(
+        database.patch_user, user_id, {DatabaseKeys.User.ACCESS_LEVEL: access_level}
+    )
 
     if not update_response.success:
         await query.edit_message_text(strings.MSG_UPDATE_FAILED)
         return
 
-    await query.edit_message_text(strings.MSG_ACCESS_LEVEL_CHANGED)
+    user_cache.invalidate(user_id)
+    invalidate_admin_views()
 
-    context.args = [str(user_id)]
-    await get_user(update, context)
+    user[DatabaseKeys.User.ACCESS_LEVEL] = access_level
+    message, keyboard = render_user_card(user)
+
+    await query.edit_message_text(
+        f"{strings.MSG_ACCESS_LEVEL_CHANGED}\n\n{message}", reply_markup=keyboard
+    )
 
 
 @bot.callback_for("forward_requests")
 @auth_required(min_level=AccessLevel.ADMIN, verbose=False)
-async def forward_requests(update: Update, context: ContextTypes.DEFAULT_TYPE):
+@callback_with_user(FORWARD_REQUESTS_DATA)
+async def forward_requests(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, query: CallbackQuery, user: dict
+):
     """
     Handle the /forward_requests command.
     """
 
-    logger.debug(f"User {get_user_string(update)} used /forward_requests command")
-
-    query = update.callback_query
-    await query.answer()
-
-    args = query.data.split(" ")
-    if len(args) != 2:
-        await query.edit_message_text(strings.MSG_NO_USER_ID)
-        return
-
-    user_id = args[1]
-
-    if user_id.startswith("ID"):
-        user_id = int(user_id[2:])
-
-    response = Database().get_user(user_id)
-
-    if not response.success:
-        await query.edit_message_text(strings.MSG_USER_NOT_FOUND)
-        return
+    log_user_action(update, "/forward_requests command")
 
-    user = response.data
+    chat_id = update.effective_chat.id
 
+    # Sent one by one so the requests arrive in order, the bot's rate limiter
+    # keeps them under Telegram's flood limits
     for request in user["conversation"]:
-        await context.bot.send_message(
-            chat_id=update.effective_chat.id, text=request["content"]
-        )
+        try:
+            await context.bot.send_message(chat_id=chat_id, text=request["content"])
+        except Exception as e:
+            logger.error(f"Failed to forward request: {e}")
 
     await query.edit_message_text(strings.MSG_REQUESTS_FORWARDED)
 
@@ -653,16 +849,14 @@ async def reset(update: Update, _: ContextTypes.DEFAULT_TYPE):
     Reset the conversation with the user.
     """
 
-    logger.debug(f"User {get_user_string(update)} used /reset command")
+    log_user_action(update, "/reset command")
 
-    user = Database().get_user_by_update(update)
+    user_id = update.effective_user.id
+    response = await asyncio.to_thread(database.clear_conversation, user_id)
+    user_cache.invalidate(user_id)
 
-    if not user.success:
+    if not response.success:
         await update.message.reply_text(strings.MSG_USER_NOT_FOUND)
         return
 
-    user = user.data
-
-    user["conversation"] = []
-    Database().update_user_by_id(user["id"], user)
     await update.message.reply_text(strings.MSG_RESET)
@@ -0,0 +1,35 @@
+"""
+HTTP request backend of the bot that decodes Telegram API responses with orjson.
+
+Every update received by polling and every message sent or edited comes back
+as a JSON response, so the standard library decoder used by python-telegram-bot
+is swapped for the much faster orjson one.
+"""
+
+from typing import Any, Dict
+
+import orjson
+from telegram.request import HTTPXRequest
+
+
+class OrjsonRequest(HTTPXRequest):
+    """
+    :class:`telegram.request.HTTPXRequest` that parses responses with orjson.
+    """
+
+    @staticmethod
+    def parse_json_payload(payload: bytes) -> Dict[str, Any]:
+        """
+        Parse a Telegram API response.
+
+        Args:
+            payload: The raw response body.
+
+        Returns:
+            The decoded JSON object.
+        """
+        try:
+            return orjson.loads(payload)
+        except orjson.JSONDecodeError:
+            # Let the default parser replace invalid UTF-8 or raise the usual error
+            return HTTPXRequest.parse_json_payload(payload)
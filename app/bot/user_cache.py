@@ -0,0 +1,125 @@
+"""
+Short-lived in-memory cache of user records keyed by Telegram user ID.
+
+Every update needs the record of its sender, so it is kept here for
+`USER_CACHE_TTL` seconds instead of being read from the database each time.
+At most `USER_CACHE_MAX_SIZE` records are kept, the least recently used
+ones are evicted first. Handlers that change a user record must call
+:func:`invalidate` for it.
+
+A record read from the database may be outdated by the time it is cached if
+it was changed meanwhile, so readers take the user's :func:`generation`
+before the read and pass it to :func:`put`, which skips the record if the
+user has been invalidated since.
+
+All functions are synchronous and only called from the event loop,
+so no locking is needed.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from app.constants.defaults import USER_CACHE_MAX_SIZE, USER_CACHE_TTL
+
+cache: OrderedDict[int, Tuple[float, dict]] = OrderedDict()
+generations: Dict[int, int] = {}
+
+
+def get(user_id: int) -> Optional[dict]:
+    """
+    Get a cached user record.
+
+    Args:
+        user_id: The ID of the user.
+
+    Returns:
+        A shallow copy of the record or None if it is not cached or has expired.
+    """
+    entry = cache.get(user_id)
+    if entry is None:
+        return None
+
+    expires_at, user = entry
+    if expires_at <= time.monotonic():
+        cache.pop(user_id, None)
+        return None
+
+    cache.move_to_end(user_id)
+    return dict(user)
+
+
+def generation(user_id: int) -> int:
+    """
+    Get the number of times a user record has been invalidated.
+
+    Args:
+        user_id: The ID of the user.
+
+    Returns:
+        The generation of the record.
+    """
+    return generations.get(user_id, 0)
+
+
+def put(user_id: int, user: dict, generation: Optional[int] = None) -> None:
+    """
+    Cache a user record.
+
+    Args:
+        user_id: The ID of the user.
+        user: The user data dictionary.
+        generation: The generation of the record when it was read, if set the
+            record is not cached if it has been invalidated since.
+    """
+    if generation is not None and generations.get(user_id, 0) != generation:
+        return
+
+    cache[user_id] = (time.monotonic() + USER_CACHE_TTL, dict(user))
+    cache.move_to_end(user_id)
+
+    if len(cache) > USER_CACHE_MAX_SIZE:
+        cache.popitem(last=False)
+
+
+def invalidate(user_id: int) -> None:
+    """
+    Drop a user record from the cache after it has been changed.
+
+    Args:
+        user_id: The ID of the user.
+    """
+    generations[user_id] = generations.get(user_id, 0) + 1
+    cache.pop(user_id, None)
+
+
+if __name__ == "__main__":
+    user = {"id": 1, "conversation": []}
+
+    put(1, user)
+    cached = get(1)
+    assert cached == user and cached is not user
+    cached["conversation"] = None
+    assert get(1) == user
+
+    invalidate(1)
+    assert get(1) is None
+
+    # A record read before an invalidation is not cached, one read after it is
+    read_generation = generation(1)
+    invalidate(1)
+    put(1, user, read_generation)
+    assert get(1) is None
+    put(1, user, generation(1))
+    assert get(1) == user
+
+    USER_CACHE_MAX_SIZE = 2
+    put(2, user)
+    get(1)
+    put(3, user)
+    assert get(2) is None
+    assert get(1) == get(3) == user
+
+    USER_CACHE_TTL = 0
+    put(4, user)
+    assert get(4) is None
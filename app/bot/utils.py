@@ -1,12 +1,16 @@
-import inspect
+import asyncio
+import re
+from contextvars import ContextVar
 from enum import Enum
 from functools import wraps
-from typing import Callable, Any, Tuple, List, Optional
+from itertools import chain
+from typing import Callable, Dict, Tuple, List, Optional, Sequence
 
 from telegram import Update
 from telegram.ext import (
+    AIORateLimiter,
+    BaseHandler,
     CallbackQueryHandler,
-    CommandHandler,
     CallbackContext,
     Application,
     MessageHandler,
@@ -14,100 +18,399 @@ from telegram.ext import (
 )
 from telegram.ext import ApplicationBuilder, ContextTypes
 
+from app.bot import user_cache
+from app.bot.request import OrjsonRequest
 from app.database import Database
+from app.database.abstraction import Response
 from app.utils import Singleton
 
 from app.startup import (
+    BOT_MAX_CONCURRENT_UPDATES,
+    DROP_PENDING_UPDATES,
     MAINTENANCE_ACCESS_LEVEL,
     MIN_REQUIRED_ACCESS_LEVEL,
     MAINTENANCE_MODE,
+    WEBHOOK_LISTEN,
+    WEBHOOK_PATH,
+    WEBHOOK_PORT,
+    WEBHOOK_SECRET_TOKEN,
+    WEBHOOK_URL,
 )
-from app.constants.defaults import DEFAULT_ACCESS_LEVEL
-from app.constants import DatabaseKeys
+from app.constants.defaults import (
+    BOT_CONNECTION_POOL_SIZE,
+    BOT_GROUP_MAX_RATE,
+    BOT_MAX_RETRIES,
+    BOT_OVERALL_MAX_RATE,
+    DEFAULT_ACCESS_LEVEL,
+)
+from app.constants import AccessLevel, DatabaseKeys
 from app.constants.strings import (
     MSG_STATE_MAINTENANCE,
     MSG_ERROR_UNKNOWN,
     MSG_NEED_HIGHER_ACCESS_LEVEL,
     MSG_ERROR_EXPECTED_ARGS,
     MSG_ERROR_EXPECTED_AT_LEAST_ARGS,
+    MSG_NO_USER_ID,
+    MSG_USER_NOT_FOUND,
 )
 
 from loguru import logger
 
+# User of the update being handled. PTB handles every update in its own task,
+# so concurrent updates from the same user never see each other's record
+current_user: ContextVar[Optional[dict]] = ContextVar("current_user", default=None)
+CALLBACK_ARGUMENTS_DIVIDER = " "
+
+database = Database()
+
 
-async def async_independent_call(func, *args, **kwargs) -> Any:
+async def get_current_user(
+    update: Update, context: CallbackContext
+) -> Response[dict]:
     """
-    Wrapper around logic of running function async-/synchronously depending
-    on target function type - telegram handler or business logic.
+    Get the user that sent the update, preferring the record already fetched by
+    :func:`auth_required` for the current update and then the user cache over
+    a new database lookup.
 
     Args:
-        func: Target function to call in async or sync mode depending on its type.
-        *args: *args that will be provided to target function.
-        **kwargs: **kwargs that will be provided to target function.
+        update: The update to get the user for.
+        context: The context of the update.
 
     Returns:
-        Result of target function.
+        A Response object containing the user's data dictionary.
     """
 
-    if inspect.iscoroutinefunction(func):
-        return await func(*args, **kwargs)
-    else:
-        return func(*args, **kwargs)
+    user = current_user.get()
+    if user is not None:
+        return Response(success=True, data=user)
 
+    user_id = update.effective_user.id
+    user = user_cache.get(user_id)
+    if user is not None:
+        return Response(success=True, data=user)
 
-def auth_required(min_level=MIN_REQUIRED_ACCESS_LEVEL, verbose=True, **kwargs: dict):
+    generation = user_cache.generation(user_id)
+    response = await asyncio.to_thread(database.get_user_by_update, update)
+    if response.success and response.data:
+        user_cache.put(user_id, response.data, generation)
+    return response
+
+
+def access_checker(min_level: int) -> Optional[Callable[[dict], Optional[str]]]:
     """
-    Decorator for checking if a user is authorized to use a command.
+    Build the access check of a handler that requires `min_level`.
+
+    The check is specialized once per handler: every user is at least a guest, so
+    checks against the guest level always pass and are dropped, and handlers open
+    to guests outside maintenance need no check at all.
 
     Args:
-        min_level: Minimum access level for calling specified function.
+        min_level: Minimum access level for calling the handler.
+
+    Returns:
+        None if every user may call the handler, otherwise a function that takes
+        a user data dictionary and returns None if the user may call the handler
+        or the message explaining why they may not.
+    """
+
+    # Bind module-level settings once, so the check reads closure variables
+    # instead of looking up globals and nested class attributes per update
+    access_level_key = DatabaseKeys.User.ACCESS_LEVEL
+    default_access_level = DEFAULT_ACCESS_LEVEL
+    maintenance_access_level = MAINTENANCE_ACCESS_LEVEL
+
+    check_maintenance = (
+        MAINTENANCE_MODE and maintenance_access_level > AccessLevel.GUEST
+    )
+    check_level = min_level > AccessLevel.GUEST
+
+    if not (check_maintenance or check_level):
+        return None
+
+    def check(user: dict) -> Optional[str]:
+        access_level = user.get(access_level_key, default_access_level)
+
+        if check_maintenance and access_level < maintenance_access_level:
+            return MSG_STATE_MAINTENANCE
+
+        if check_level and access_level < min_level:
+            return MSG_NEED_HIGHER_ACCESS_LEVEL
+
+        return None
+
+    return check
+
+
+def arguments_parser(
+    min_arguments: Optional[int],
+    exact_arguments: Optional[int],
+    divider: str,
+) -> Callable[[str], Optional[Sequence[str]]]:
+    """
+    Build the parser of callback query arguments.
+
+    Args:
+        min_arguments: Minimum required arguments count.
+        exact_arguments: Exact arguments count, overrides `min_arguments` if set.
+        divider: Separator of the arguments in the callback data.
+
+    Returns:
+        A function that takes the callback data and returns its arguments, as a tuple
+        if `exact_arguments` is set and a list otherwise, or None if their count
+        does not match.
+    """
+
+    if exact_arguments is not None and len(divider) == 1:
+        # The data is matched by a pattern with one group per argument, so
+        # malformed data is rejected without splitting it
+        argument = f"([^{re.escape(divider)}]*)"
+        pattern = re.compile(re.escape(divider).join([argument] * exact_arguments))
+
+        def parse_exact(data: str) -> Optional[Sequence[str]]:
+            match = pattern.fullmatch(data)
+            return match.groups() if match else None
+
+        return parse_exact
+
+    if exact_arguments is not None:
+
+        def parse_split(data: str) -> Optional[Sequence[str]]:
+            args = tuple(data.split(divider))
+            return args if len(args) == exact_arguments else None
+
+        return parse_split
+
+    def parse(data: str) -> Optional[Sequence[str]]:
+        args = data.split(divider)
+        if min_arguments is not None and len(args) < min_arguments:
+            return None
+        return args
+
+    return parse
+
+
+def arguments_error_message(
+    min_arguments: Optional[int],
+    exact_arguments: Optional[int],
+    error_message: Optional[str],
+) -> str:
+    """
+    Get the message shown when callback query arguments do not match.
+
+    Args:
+        min_arguments: Minimum required arguments count.
+        exact_arguments: Exact arguments count.
+        error_message: Custom error message, used if set.
+
+    Returns:
+        The error message.
+    """
+    if error_message:
+        return error_message
+    if exact_arguments is not None:
+        return MSG_ERROR_EXPECTED_ARGS.format(exact_arguments)
+    return MSG_ERROR_EXPECTED_AT_LEAST_ARGS.format(min_arguments)
+
+
+def handler_guard(
+    min_level: Optional[int] = None,
+    verbose: bool = True,
+    with_arguments: bool = False,
+    min_arguments: Optional[int] = None,
+    exact_arguments: Optional[int] = None,
+    error_message: Optional[str] = None,
+    divider: str = CALLBACK_ARGUMENTS_DIVIDER,
+):
+    """
+    Decorator checking the user and the callback query arguments of a handler in
+    a single wrapper. :func:`auth_required`, :func:`args_required` and
+    :func:`callback_handler` are built on it.
+
+    The decorated function is called as ``func(update, args, query)`` if
+    `with_arguments` is set and as ``func(update, context)`` otherwise.
+
+    Args:
+        min_level: Minimum access level for calling specified function, the user is not checked if None.
         verbose: Whether to send information about the fact that user needs higher access level.
-        kwargs: Keyword arguments to pass to the decorator.
+        with_arguments: Whether the update is a callback query whose arguments are passed to the function.
+        min_arguments: Minimum required arguments count.
+        exact_arguments: Exact arguments count will override min_arguments if set.
+        error_message: Error message that will be shown when arguments count comparison encounters a failure.
+        divider: Separator of the arguments in the callback data.
 
     Returns:
         A decorator function.
     """
 
     def decorator(func: Callable):
-        @wraps(func)
-        async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
-            user = Database().get_user_by_update(update).data
-            if not user:
-                if verbose:
-                    await update.message.reply_text(MSG_ERROR_UNKNOWN)
+        # Resolved once here rather than on every call of the wrapped handler
+        is_coroutine = asyncio.iscoroutinefunction(func)
+        check_user = min_level is not None
+        check_access = access_checker(min_level) if check_user else None
+        if with_arguments:
+            parse_arguments = arguments_parser(min_arguments, exact_arguments, divider)
+            message = arguments_error_message(
+                min_arguments, exact_arguments, error_message
+            )
+
+        async def deny(update: Update, context: CallbackContext, text: Optional[str]):
+            query = update.callback_query
+            if query is None:
+                if text:
+                    await update.effective_message.reply_text(text)
                 return
 
-            if MAINTENANCE_MODE:
-                if (
-                    user.get(DatabaseKeys.User.ACCESS_LEVEL, DEFAULT_ACCESS_LEVEL)
-                    < MAINTENANCE_ACCESS_LEVEL
-                ):
-                    await update.message.reply_text(MSG_STATE_MAINTENANCE)
-                    return
+            if not with_arguments:
+                # The handler that would have answered the query is not called
+                context.application.create_task(query.answer(), update=update)
+            if text:
+                await query.edit_message_text(text)
 
-            if (
-                user.get(DatabaseKeys.User.ACCESS_LEVEL, DEFAULT_ACCESS_LEVEL)
-                < min_level
-            ):
-                if verbose:
-                    await update.message.reply_text(MSG_NEED_HIGHER_ACCESS_LEVEL)
-                return
+        @wraps(func)
+        async def wrapper(update: Update, context: CallbackContext):
+            query = update.callback_query
+            if with_arguments:
+                # The answer only acknowledges the button press, so it is sent in the
+                # background while the callback is handled
+                context.application.create_task(query.answer(), update=update)
+
+            token = None
+            if check_user:
+                user = (await get_current_user(update, context)).data
+                if not user:
+                    await deny(update, context, MSG_ERROR_UNKNOWN if verbose else None)
+                    return
 
-            await async_independent_call(func, update, context)
+                if check_access is not None:
+                    denied_message = check_access(user)
+                    if denied_message is not None:
+                        if not (verbose or denied_message is MSG_STATE_MAINTENANCE):
+                            denied_message = None
+                        await deny(update, context, denied_message)
+                        return
+
+                # Keep the user for the lifetime of this update only, so handlers can
+                # reuse it instead of querying the database again.
+                token = current_user.set(user)
+
+            try:
+                if with_arguments:
+                    args = parse_arguments(query.data)
+                    if args is None:
+                        await query.edit_message_text(message)
+                        return
+                    handler_args = (update, args, query)
+                else:
+                    handler_args = (update, context)
+
+                if is_coroutine:
+                    return await func(*handler_args)
+                # Sync handlers can't talk to Telegram and only do blocking work,
+                # so they run in a thread instead of stalling other updates
+                return await asyncio.to_thread(func, *handler_args)
+            finally:
+                if token is not None:
+                    current_user.reset(token)
 
         return wrapper
 
     return decorator
 
 
-def args_required(min_arguments=None, exact_arguments=None, error_message=None):
+def auth_required(min_level=MIN_REQUIRED_ACCESS_LEVEL, verbose=True, **kwargs: dict):
+    """
+    Decorator for checking if a user is authorized to use a command.
+
+    Args:
+        min_level: Minimum access level for calling specified function.
+        verbose: Whether to send information about the fact that user needs higher access level.
+        kwargs: Keyword arguments to pass to the decorator.
+
+    Returns:
+        A decorator function.
+    """
+    return handler_guard(min_level=min_level, verbose=verbose)
+
+
+def args_required(
+    min_arguments=None,
+    exact_arguments=None,
+    error_message=None,
+    divider=CALLBACK_ARGUMENTS_DIVIDER,
+):
     """
-    Decorator for ensuring if function arguments match defined conditions or not.
+    Decorator for ensuring if callback query arguments match defined conditions or not.
+
+    The callback data is split by `divider` and the decorated function is called
+    as ``func(update, args, query)``, where `args` is a tuple if `exact_arguments`
+    is set and a list otherwise.
 
     Args:
         min_arguments: Minimum required arguments count.
         exact_arguments: Exact arguments count will override min_arguments if set to anything else than 0.
         error_message: Error message that will be shown when arguments count comparison encounters a failure.
+        divider: Separator of the arguments in the callback data.
+
+    Returns:
+        A decorator function.
+    """
+    return handler_guard(
+        with_arguments=True,
+        min_arguments=min_arguments,
+        exact_arguments=exact_arguments,
+        error_message=error_message,
+        divider=divider,
+    )
+
+
+def callback_handler(
+    min_level=MIN_REQUIRED_ACCESS_LEVEL,
+    min_arguments=None,
+    exact_arguments=None,
+    error_message=None,
+    divider=CALLBACK_ARGUMENTS_DIVIDER,
+):
+    """
+    Decorator combining :func:`auth_required` and :func:`args_required` for callback
+    handlers in a single wrapper.
+
+    The callback query is answered, the user is checked like ``auth_required(min_level,
+    verbose=False)`` and the arguments like :func:`args_required`, then the decorated
+    function is called as ``func(update, args, query)``.
+
+    Args:
+        min_level: Minimum access level for calling specified function.
+        min_arguments: Minimum required arguments count.
+        exact_arguments: Exact arguments count will override min_arguments if set.
+        error_message: Error message that will be shown when arguments count comparison encounters a failure.
+        divider: Separator of the arguments in the callback data.
+
+    Returns:
+        A decorator function.
+    """
+    return handler_guard(
+        min_level=min_level,
+        verbose=False,
+        with_arguments=True,
+        min_arguments=min_arguments,
+        exact_arguments=exact_arguments,
+        error_message=error_message,
+        divider=divider,
+    )
+
+
+def callback_with_user(pattern: re.Pattern, error_message=MSG_NO_USER_ID):
+    """
+    Decorator for callback handlers whose data refers to another user.
+
+    The callback query is answered, its data is matched against `pattern` and the
+    user whose ID is captured by the first group of the pattern is fetched from the
+    database. The decorated function is called as
+    ``func(update, context, query, user, *other_groups)``.
+
+    Args:
+        pattern: Compiled pattern of the callback data, the first group must capture the user ID.
+        error_message: Error message that will be shown when the data does not match the pattern.
 
     Returns:
         A decorator function.
@@ -115,37 +418,23 @@ def args_required(min_arguments=None, exact_arguments=None, error_message=None):
 
     def decorator(func):
         @wraps(func)
-        async def wrapper(update: Update, context: CallbackContext, *args, **kwargs):
+        async def wrapper(update: Update, context: CallbackContext):
             query = update.callback_query
-            if query:
-                await query.answer()
-                callback_args = query.data.split(":")
-                if (
-                    exact_arguments is not None
-                    and len(callback_args) != exact_arguments
-                ):
-                    await query.edit_message_text(
-                        error_message or MSG_ERROR_EXPECTED_ARGS.format(exact_arguments)
-                    )
-                    return
-                if min_arguments is not None and len(callback_args) < min_arguments:
-                    await query.edit_message_text(
-                        error_message
-                        or MSG_ERROR_EXPECTED_AT_LEAST_ARGS.format(min_arguments)
-                    )
-                    return
-                return await func(update, context, *callback_args, **kwargs)
-            else:
-                if exact_arguments is not None and len(args) != exact_arguments:
-                    raise ValueError(
-                        error_message or MSG_ERROR_EXPECTED_ARGS.format(exact_arguments)
-                    )
-                if min_arguments is not None and len(args) < min_arguments:
-                    raise ValueError(
-                        error_message
-                        or MSG_ERROR_EXPECTED_AT_LEAST_ARGS.format(min_arguments)
-                    )
-                return await func(update, context, *args, **kwargs)
+            context.application.create_task(query.answer(), update=update)
+
+            match = pattern.match(query.data)
+            if not match:
+                await query.edit_message_text(error_message)
+                return
+
+            user_id, *args = match.groups()
+            response = await asyncio.to_thread(database.get_user, int(user_id))
+
+            if not response.success:
+                await query.edit_message_text(MSG_USER_NOT_FOUND)
+                return
+
+            return await func(update, context, query, response.data, *args)
 
         return wrapper
 
@@ -164,6 +453,16 @@ class HandlerType(Enum):
     UNKNOWN = 5
 
 
+TEXT_MESSAGES = filters.TEXT & ~filters.COMMAND
+
+# Handler types that map directly onto a telegram.ext.Handler, keyed by type
+HANDLER_FACTORIES: Dict[
+    HandlerType, Callable[[Optional[str], Callable], BaseHandler]
+] = {
+    HandlerType.TEXT: lambda _, handler: MessageHandler(TEXT_MESSAGES, handler),
+}
+
+
 class BotWrapper(Singleton):
     """
     Wrapper around telegram.ext.ApplicationBuilder for easier bot creation.
@@ -176,8 +475,49 @@ class BotWrapper(Singleton):
 
     def __init__(self, token: str = None):
         if token and not self.application:
-            self.application = ApplicationBuilder().token(token).build()
+            # The rate limiter throttles every request to Telegram's flood limits
+            # and retries on RetryAfter, so handlers don't have to
+            rate_limiter = AIORateLimiter(
+                overall_max_rate=BOT_OVERALL_MAX_RATE,
+                overall_time_period=1,
+                group_max_rate=BOT_GROUP_MAX_RATE,
+                group_time_period=60,
+                max_retries=BOT_MAX_RETRIES,
+            )
+            # Updates are handled concurrently so a long streamed response
+            # doesn't hold up other users, but only up to a limit so a burst of
+            # updates can't pile up unbounded handlers
+            self.application = (
+                ApplicationBuilder()
+                .token(token)
+                .request(OrjsonRequest(connection_pool_size=BOT_CONNECTION_POOL_SIZE))
+                .get_updates_request(OrjsonRequest())
+                .rate_limiter(rate_limiter)
+                .concurrent_updates(BOT_MAX_CONCURRENT_UPDATES)
+                .build()
+            )
             self.handlers: List[Tuple[HandlerType, Optional[str], Callable]] = []
+            self.callbacks: Dict[str, Callable] = {}
+            self.commands: Dict[str, Callable] = {}
+            self.unknown_command: Optional[Callable] = None
+
+    def register(self, handler_type: HandlerType, context: Optional[str] = None):
+        """
+        Decorator for registering a handler of any type in a container.
+
+        Args:
+            handler_type: Type of the handler.
+            context: Command or callback prefix the handler is registered for, if any.
+
+        Returns:
+            A decorator function that returns the handler unchanged.
+        """
+
+        def decorator(func):
+            self.handlers.append((handler_type, context, func))
+            return func
+
+        return decorator
 
     def handler_for(self, command: str):
         """
@@ -189,23 +529,20 @@ class BotWrapper(Singleton):
         Returns:
             A decorator function.
         """
-
-        def decorator(func):
-            self.handlers.append(
-                (
-                    HandlerType.COMMAND,
-                    command,
-                    func,
+        if any(
+            handler_type is HandlerType.COMMAND and context == command
+            for handler_type, context, _ in self.handlers
+        ):
+
+            def ignore(func):
+                logger.warning(
+                    f'Handler "{func.__name__}" ignored: /{command} is already registered'
                 )
-            )
-
-            def wrapper(*args, **kwargs):
-                result = func(*args, **kwargs)
-                return result
+                return func
 
-            return wrapper
+            return ignore
 
-        return decorator
+        return self.register(HandlerType.COMMAND, command)
 
     def text_handler(self):
         """
@@ -214,51 +551,22 @@ class BotWrapper(Singleton):
         Returns:
             A decorator function.
         """
-
-        def decorator(func):
-            self.handlers.append(
-                (
-                    HandlerType.TEXT,
-                    None,
-                    func,
-                )
-            )
-
-            def wrapper(*args, **kwargs):
-                result = func(*args, **kwargs)
-                return result
-
-            return wrapper
-
-        return decorator
+        return self.register(HandlerType.TEXT)
 
     def callback_for(self, pattern: str):
         """
         Decorator for registering callback handlers in a container.
 
+        Callback data is dispatched by its prefix, i.e. the part before the first
+        ":" or " ", so `pattern` must be that literal prefix.
+
         Args:
             pattern: Command to register callback handler for.
 
         Returns:
             A decorator function.
         """
-
-        def decorator(func):
-            self.handlers.append(
-                (
-                    HandlerType.CALLBACK,
-                    f"^{pattern}",
-                    func,
-                )
-            )
-
-            def wrapper(*args, **kwargs):
-                result = func(*args, **kwargs)
-                return result
-
-            return wrapper
-
-        return decorator
+        return self.register(HandlerType.CALLBACK, pattern)
 
     def unknown_command_handler(self):
         """
@@ -267,23 +575,7 @@ class BotWrapper(Singleton):
         Returns:
             A decorator function.
         """
-
-        def decorator(func):
-            self.handlers.append(
-                (
-                    HandlerType.UNKNOWN,
-                    None,
-                    func,
-                )
-            )
-
-            def wrapper(*args, **kwargs):
-                result = func(*args, **kwargs)
-                return result
-
-            return wrapper
-
-        return decorator
+        return self.register(HandlerType.UNKNOWN)
 
     def error_handler(self):
         """
@@ -292,73 +584,187 @@ class BotWrapper(Singleton):
         Returns:
             A decorator function.
         """
+        return self.register(HandlerType.ERROR)
 
-        def decorator(func):
-            self.handlers.append(
-                (
-                    HandlerType.ERROR,
-                    None,
-                    func,
-                )
-            )
+    async def dispatch_callback(self, update: Update, context: CallbackContext):
+        """
+        Call the callback handler registered for the prefix of the callback data.
 
-            def wrapper(*args, **kwargs):
-                result = func(*args, **kwargs)
-                return result
+        Args:
+            update: The update with the callback query.
+            context: The context of the update.
+        """
+        data = update.callback_query.data or ""
+        prefix = data.split(":", 1)[0].split(" ", 1)[0]
 
-            return wrapper
+        handler = self.callbacks.get(prefix)
+        if handler is None:
+            logger.warning(f'No callback handler registered for "{data}"')
+            await update.callback_query.answer()
+            return
 
-        return decorator
+        await handler(update, context)
 
-    def run(self):
+    async def dispatch_command(self, update: Update, context: CallbackContext):
         """
-        Infinitely blocking method for running bot in polling mode.
+        Call the handler registered for the command of the message, or the unknown
+        command handler if there is none.
+
+        Like telegram.ext.CommandHandler, commands are matched case-insensitively,
+        commands addressed to other bots are not matched and `context.args` is set
+        to the words following the command.
 
-        Before running, all handlers are registered in application by iterating over a `handlers` container
-        and matching their type with corresponding telegram.ext.Handler class and telegram.ext.Application
-        method for registering handler.
+        Args:
+            update: The update with the command message.
+            context: The context of the update.
         """
+        command, *args = update.effective_message.text.split()
+        command, _, username = command[1:].partition("@")
+
+        handler = None
+        if not username or username.lower() == context.bot.username.lower():
+            handler = self.commands.get(command.lower())
+
+        if handler is None:
+            handler = self.unknown_command
+            if handler is None:
+                return
 
-        unknown_cmd_handler = None
+        context.args = args
+        await handler(update, context)
+
+    def register_handlers(self):
+        """
+        Register all handlers in application by iterating over a `handlers` container
+        and building the telegram.ext.Handler for their type from `HANDLER_FACTORIES`; types that need
+        special treatment (commands, callbacks, errors, unknown commands) are matched explicitly.
+        """
+
+        telegram_handlers = []
 
         for handler_type, context, handler in self.handlers:
+            factory = HANDLER_FACTORIES.get(handler_type)
+            if factory is not None:
+                telegram_handlers.append(factory(context, handler))
+                logger.debug("Registered {}:{}", handler_type, handler.__name__)
+                continue
+
             match handler_type:
                 case HandlerType.COMMAND:
-                    self.application.add_handler(CommandHandler(context, handler))
-                case HandlerType.TEXT:
-                    self.application.add_handler(
-                        MessageHandler(filters.TEXT & ~filters.COMMAND, handler)
-                    )
+                    self.commands[context.lower()] = handler
                 case HandlerType.CALLBACK:
                     logger.debug(
-                        f"Registering callback handler: {handler.__name__} with pattern: {context}"
-                    )
-                    self.application.add_handler(
-                        CallbackQueryHandler(handler, pattern=context)
+                        "Registering callback handler: {} with prefix: {}",
+                        handler.__name__,
+                        context,
                     )
+                    self.callbacks[context] = handler
                 case HandlerType.ERROR:
                     self.application.add_error_handler(handler)
                 case HandlerType.UNKNOWN:
-                    unknown_cmd_handler = handler
+                    self.unknown_command = handler
                 case _:
                     logger.error(
                         f'Unknown type "{handler_type}" for handler "{handler}" with context "{context}"'
                     )
 
-            logger.debug(f"Registered {handler_type}:{handler.__name__}")
+            logger.debug("Registered {}:{}", handler_type, handler.__name__)
 
-        if unknown_cmd_handler:
-            self.application.add_handler(
-                MessageHandler(filters.COMMAND, unknown_cmd_handler)
-            )
-            logger.debug(
-                f"Registered unknown command handler: {unknown_cmd_handler.__name__}"
+        # A single handler looks callbacks up by prefix instead of letting the
+        # application try every registered pattern in turn
+        if self.callbacks:
+            telegram_handlers.append(CallbackQueryHandler(self.dispatch_callback))
+
+        # Likewise, commands are looked up by name in a single handler, which also
+        # answers unknown commands
+        if self.commands or self.unknown_command:
+            telegram_handlers.append(
+                MessageHandler(filters.COMMAND, self.dispatch_command)
             )
 
-        logger.debug(f"Registered handlers: {len(self.application.handlers[0])}")
+        # Register all handlers in one call
+        self.application.add_handlers(telegram_handlers)
+
+        logger.opt(lazy=True).debug(
+            "Registered handlers: {}",
+            lambda: [
+                handler.callback.__name__
+                for handler in chain.from_iterable(self.application.handlers.values())
+            ],
+        )
+
+    def run_polling(
+        self,
+        *,
+        timeout: int = 10,
+        drop_pending_updates: bool = False,
+        **kwargs,
+    ):
+        """
+        Infinitely blocking method for running bot in polling mode.
 
-        self.application.run_polling()
+        Args:
+            timeout: Seconds each getUpdates request waits for new updates.
+            drop_pending_updates: Whether to skip updates that arrived while the bot was offline.
+            kwargs: Other arguments of telegram.ext.Application.run_polling.
+        """
+        self.register_handlers()
+
+        self.application.run_polling(
+            timeout=timeout, drop_pending_updates=drop_pending_updates, **kwargs
+        )
+
+    def run_webhook(
+        self,
+        listen: str,
+        port: int,
+        url_path: str,
+        webhook_url: str,
+        secret_token: Optional[str] = None,
+        drop_pending_updates: bool = False,
+    ):
+        """
+        Infinitely blocking method for running bot in webhook mode.
+
+        Telegram pushes updates to `webhook_url`, which must be reachable from the
+        internet and forwarded to `listen`:`port`/`url_path`. Every request is
+        answered as soon as its update is queued, handlers run afterwards.
+
+        Args:
+            listen: Address to listen on.
+            port: Port to listen on.
+            url_path: Path of the webhook endpoint.
+            webhook_url: Public URL of the webhook endpoint registered with Telegram.
+            secret_token: Token Telegram sends with every request, requests without it are rejected.
+            drop_pending_updates: Whether to skip updates that arrived while the bot was offline.
+        """
+        self.register_handlers()
+
+        logger.info(f"Listening for webhook requests on {listen}:{port}/{url_path}")
+        self.application.run_webhook(
+            listen=listen,
+            port=port,
+            url_path=url_path,
+            webhook_url=webhook_url,
+            secret_token=secret_token,
+            drop_pending_updates=drop_pending_updates,
+        )
 
+    def run(self):
+        """
+        Infinitely blocking method for running bot.
+
+        The bot runs in webhook mode if a webhook URL is configured and in polling mode otherwise.
+        """
+        if WEBHOOK_URL:
+            self.run_webhook(
+                listen=WEBHOOK_LISTEN,
+                port=WEBHOOK_PORT,
+                url_path=WEBHOOK_PATH,
+                webhook_url=WEBHOOK_URL,
+                secret_token=WEBHOOK_SECRET_TOKEN,
+                drop_pending_updates=DROP_PENDING_UPDATES,
+            )
+            return
 
-# Monkey patching for running bot like native telegram.ext.Application
-BotWrapper.run_polling = BotWrapper.run
+        self.run_polling(drop_pending_updates=DROP_PENDING_UPDATES)
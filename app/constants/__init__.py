@@ -1,3 +1,5 @@
+from functools import lru_cache
+
 from . import strings
 from . import openai_models
 from . import paths
@@ -41,6 +43,9 @@ class AccessLevel:
     MODERATOR = 3
     ADMIN = 4
 
+    # All access levels in ascending order
+    ALL = (GUEST, USER, PRIVILEGED_USER, MODERATOR, ADMIN)
+
     __translations = {
         "en": {
             GUEST: "Guest",
@@ -58,26 +63,24 @@ class AccessLevel:
         },
     }
 
+    # Lowercase access level names mapped to their levels, per locale
+    __levels_by_name = {
+        locale: {name.lower(): level for level, name in translations.items()}
+        for locale, translations in __translations.items()
+    }
+
     @staticmethod
-    def all() -> list[int]:
+    def all() -> tuple[int, ...]:
         """
-        Returns a list of all access levels as integers.
+        Returns all access levels as integers.
 
         Returns:
-            list[int]: A sorted list of integers representing all access levels.
+            tuple[int, ...]: A sorted tuple of integers representing all access levels.
         """
-        return sorted(
-            [
-                getattr(AccessLevel, attr)
-                for attr in dir(AccessLevel)
-                if not attr.startswith("__")
-                and not callable(getattr(AccessLevel, attr))
-                and attr.isupper()
-                and isinstance(getattr(AccessLevel, attr), int)
-            ]
-        )
+        return AccessLevel.ALL
 
     @classmethod
+    @lru_cache(maxsize=64)
     def from_int(cls, access_level: int, locale: str = "ru") -> str:
         """
         Returns the name of the access level corresponding to the given integer value.
@@ -88,6 +91,9 @@ class AccessLevel:
 
         Returns:
             A string representing the name of the access level corresponding to the given integer value.
+
+        Note:
+            Results are memoized, since there are only a few locales and access levels.
         """
 
         translations = cls.__translations.get(locale, {})
@@ -116,10 +122,10 @@ class AccessLevel:
             ValueError: If the given string value does not correspond to a valid access level.
         """
 
-        for level, level_names in cls.__translations[locale].items():
-            if access_level.lower() == level_names.lower():
-                return level
-        raise ValueError(f"Invalid access level string: {access_level}")
+        try:
+            return cls.__levels_by_name[locale][access_level.lower()]
+        except KeyError:
+            raise ValueError(f"Invalid access level string: {access_level}") from None
 
 
 class DatabaseKeys:
@@ -145,6 +151,7 @@ class DatabaseKeys:
             UNIQUE_ID: Unique user id
             LANGUAGE_CODE: Language code
             LOCAL_MODEL: OpenAI model name
+            QUESTIONS_COUNT: Number of questions the user has asked
         """
 
         ACCESS_LEVEL = "access_level"
@@ -152,6 +159,7 @@ class DatabaseKeys:
         ID = "id"
         LANGUAGE_CODE = "language_code"
         CHOSEN_MODEL = "local_model"
+        QUESTIONS_COUNT = "questions_count"
 
     class Bot:
         """
@@ -1,3 +1,5 @@
+import math
+
 from app.constants import DatabaseKeys
 from app.constants.models import (
     AvailableModels,
@@ -14,6 +16,101 @@ DEFAULT_NEW_USER = {
     DatabaseKeys.User.ACCESS_LEVEL: DEFAULT_ACCESS_LEVEL,
     DatabaseKeys.User.CONVERSATION: DEFAULT_CONVERSATION,
     DatabaseKeys.User.CHOSEN_MODEL: DEFAULT_MODEL.name,
+    DatabaseKeys.User.QUESTIONS_COUNT: 0,
 }
 
-RATE_LIMIT_PAUSE = 2
+# Seconds to wait for the first part of a response before sending a placeholder
+PLACEHOLDER_DELAY = 1
+
+# Number of new characters after which a streamed response is flushed early
+STREAM_FLUSH_SIZE = 512
+
+# Minimum number of new characters for a streamed response to be edited
+STREAM_MIN_EDIT_SIZE = 24
+
+# Characters at which a streamed response is preferably cut for an edit, and
+# the number of new characters after which it is cut anywhere
+STREAM_FLUSH_BOUNDARIES = (" ", ".", ",", "\n", "!", "?", ";", ":")
+STREAM_BOUNDARY_MAX_WAIT = 64
+
+# (max response length, seconds between edits) pairs for streamed responses,
+# longer responses are edited every STREAM_EDIT_MAX_DELAY seconds; all delays
+# are scaled by the ratio of the current stream edit pause to that default
+STREAM_EDIT_DELAYS = ((320, 0.18), (1024, 0.24))
+STREAM_EDIT_MAX_DELAY = 0.8
+
+
+class RateLimits:
+    """
+    Rate limits that admins can change while the bot is running.
+
+    Handlers read the attributes on every use, so unlike module constants
+    imported by value, changes take effect immediately.
+
+    Attributes:
+        MIN_PAUSE: Lower bound of the stream edit pause in seconds.
+        MAX_PAUSE: Upper bound of the stream edit pause in seconds.
+        stream_edit_pause: Seconds between edits of long streamed responses, shorter ones are edited proportionally more often.
+    """
+
+    MIN_PAUSE = 0.05
+    MAX_PAUSE = 30
+
+    stream_edit_pause: float = STREAM_EDIT_MAX_DELAY
+
+    @classmethod
+    def set_stream_edit_pause(cls, pause: float) -> float:
+        """
+        Set the stream edit pause, clamped to the allowed bounds.
+
+        Args:
+            pause: New pause in seconds.
+
+        Returns:
+            The pause that was set.
+
+        Raises:
+            ValueError: If the pause is not a finite number.
+        """
+        if not math.isfinite(pause):
+            raise ValueError(f"Invalid pause: {pause}")
+
+        cls.stream_edit_pause = min(max(pause, cls.MIN_PAUSE), cls.MAX_PAUSE)
+        return cls.stream_edit_pause
+
+
+# Seconds for which user records are served from memory
+USER_CACHE_TTL = 10 * 60
+
+# Maximum number of user records kept in memory
+USER_CACHE_MAX_SIZE = 10_000
+
+# Seconds for which, and maximum number of, users read from Redis are kept
+# in the storage provider's own cache
+REDIS_USER_CACHE_TTL = 60
+REDIS_USER_CACHE_MAX_SIZE = 1024
+
+# Maximum number of connections to Redis, the most worker threads
+# asyncio.to_thread uses by default
+REDIS_MAX_CONNECTIONS = 32
+
+# Seconds for which the IDs of admins notified about errors are cached
+ADMIN_IDS_CACHE_TTL = 60
+
+# Seconds for which admin views (/users, /user) are served from memory
+ADMIN_VIEWS_CACHE_TTL = 5
+
+# Size in bytes up to which /dump is built in memory before spilling to disk
+DUMP_SPOOL_MAX_SIZE = 16 << 20
+
+# Telegram flood limits enforced by the bot's rate limiter: messages per
+# second across all chats and messages per minute in a single group
+BOT_OVERALL_MAX_RATE = 30
+BOT_GROUP_MAX_RATE = 20
+
+# Number of times a request is retried after Telegram answers with RetryAfter
+BOT_MAX_RETRIES = 2
+
+# Number of connections the bot keeps open to the Telegram API, apart from the
+# single long-polling connection
+BOT_CONNECTION_POOL_SIZE = 256
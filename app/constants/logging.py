@@ -1,3 +1,5 @@
+import os
+
 LOGGING_FORMAT_CONSOLE = '<cyan>{time:YYYY-MM-DD HH:mm:ss.SSS}</cyan> ' \
                         '<level>{level: <8}</level>' \
                         '<green>{file.name: <12}:{line: <6}</green>' \
@@ -9,8 +11,24 @@ LOGGING_FORMAT_FILE = '{time:YYYY-MM-DD HH:mm:ss.SSS} ' \
 
 AVAILABLE_LOGGING_LEVELS = ['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL']
 DEFAULT_LOGGING_LEVEL = AVAILABLE_LOGGING_LEVELS[1]
-LOGGING_LEVEL_FOR_FILE = 'DEBUG' or DEFAULT_LOGGING_LEVEL
-LOGGING_LEVEL_FOR_CONSOLE = 'DEBUG' or DEFAULT_LOGGING_LEVEL
+
+
+def get_logging_level(env_variable: str) -> str:
+    """
+    Get a logging level from an environment variable.
+
+    Args:
+        env_variable: Name of the environment variable.
+
+    Returns:
+        The level set in the environment variable, or the default level if it is unset or invalid.
+    """
+    level = os.getenv(env_variable, DEFAULT_LOGGING_LEVEL).upper()
+    return level if level in AVAILABLE_LOGGING_LEVELS else DEFAULT_LOGGING_LEVEL
+
+
+LOGGING_LEVEL_FOR_FILE = get_logging_level('LOG_LEVEL_FILE')
+LOGGING_LEVEL_FOR_CONSOLE = get_logging_level('LOG_LEVEL_CONSOLE')
 
 LOG_FILE_COMPRESSION = 'zip'
 LOG_FILE_ROTATION = '500 MB'
@@ -8,6 +8,11 @@ class AvailableModels:
     """
     Available models container.
     Models are stored as :class:`app.dto.Model` objects.
+
+    Attributes:
+        ALL_MODELS: All models in the order they are defined.
+        BY_NAME: Mapping of model names to models.
+        BY_ACCESS_LEVEL: Mapping of access levels to the models available at them.
     """
 
     GPT3_5_TURBO = Model(
@@ -60,12 +65,14 @@ class AvailableModels:
     )
 
     @classmethod
-    def ALL(cls) -> list[Model]:
-        models = []
-        for attr in cls.__dict__:
-            if isinstance(cls.__dict__[attr], Model):
-                models.append(cls.__dict__[attr])
-        return models
+    def ALL(cls) -> tuple[Model, ...]:
+        """
+        Get all models.
+
+        Returns:
+            All models in the order they are defined.
+        """
+        return cls.ALL_MODELS
 
     @staticmethod
     def filter_by_access_level(access_level: AccessLevel):
@@ -76,13 +83,17 @@ class AvailableModels:
             access_level: Access level to filter by.
 
         Returns:
-            Filtered list of models.
+            Filtered models.
         """
-        return [
+        models = AvailableModels.BY_ACCESS_LEVEL.get(access_level)
+        if models is not None:
+            return models
+
+        return tuple(
             model
-            for model in AvailableModels.ALL()
+            for model in AvailableModels.BY_NAME.values()
             if model.min_access_level <= access_level
-        ]
+        )
 
     @staticmethod
     def latest_free():
@@ -93,3 +104,18 @@ class AvailableModels:
             Latest free model.
         """
         return AvailableModels.LLAMA3_1
+
+
+# Indexes of models by name and by access level, built once at import time
+AvailableModels.ALL_MODELS = tuple(
+    value for value in vars(AvailableModels).values() if isinstance(value, Model)
+)
+AvailableModels.BY_NAME = {model.name: model for model in AvailableModels.ALL_MODELS}
+AvailableModels.BY_ACCESS_LEVEL = {
+    level: tuple(
+        model
+        for model in AvailableModels.BY_NAME.values()
+        if model.min_access_level <= level
+    )
+    for level in AccessLevel.ALL
+}
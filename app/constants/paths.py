@@ -5,7 +5,8 @@ from loguru import logger
 
 ROOT_MODULE = "app"
 
-TMP_FILE_NAME = "dump.json"
+# Name of the document sent by /dump, the dump itself is never written to this path
+DUMP_FILE_NAME = "dump.json"
 
 PROJECT_DIR = pathlib.Path(__file__).parent.parent.parent
 PROJECT_NAME = PROJECT_DIR.name
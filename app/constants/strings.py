@@ -16,6 +16,14 @@ MSG_HELP = (
     "/state - проверить состояние бота.\n"
 )
 
+# Admin commands list
+MSG_ADMIN_COMMANDS = (
+    "/set_rate_limit_pause <seconds>\n"
+    "/user <user_id>\n"
+    "/users\n"
+    "/dump"
+)
+
 # Unknown command error messages
 MSG_UNKNOWN_COMMAND = "Неизвестная команда. Чтобы узнать, что я умею, напиши /help."
 
@@ -80,7 +88,7 @@ MSG_CANCELLED = "Операция отменена."
 
 
 MSG_INVALID_RATE_LIMIT_PAUSE = (
-    "Неверный формат аргумента. Используйте целое положительное число."
+    "Неверный формат аргумента. Используйте положительное число."
 )
 MSG_RATE_LIMIT_PAUSE_SET = "Задержка ограничения скорости установлена на {0} секунд."
 MSG_NOT_ENOUGH_ARGUMENTS = "Недостаточно аргументов."
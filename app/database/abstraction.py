@@ -154,6 +154,47 @@ class StorageProvider(Singleton, ABC):
         """
         raise NotImplementedError
 
+    @abstractmethod
+    def patch_user(self, user_id: int, fields: dict) -> Response[bool]:
+        """
+        Update some fields of a user's data without rewriting the rest of it.
+
+        Args:
+            user_id (int): The ID of the user to update.
+            fields (dict): A dictionary mapping the keys of the fields to update to their new values.
+
+        Returns:
+            Response[bool]: A Response object indicating whether the update was successful.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def append_exchange(self, user_id: int, messages: list) -> Response[bool]:
+        """
+        Append messages to a user's conversation and count one more question in a single atomic update.
+
+        Args:
+            user_id (int): The ID of the user to update.
+            messages (list): The question and the answer to append to the conversation.
+
+        Returns:
+            Response[bool]: A Response object indicating whether the update was successful.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def clear_conversation(self, user_id: int) -> Response[bool]:
+        """
+        Clear the conversation history of a user without rewriting the rest of their data.
+
+        Args:
+            user_id (int): The ID of the user whose conversation should be cleared.
+
+        Returns:
+            Response[bool]: A Response object indicating whether the conversation was cleared.
+        """
+        raise NotImplementedError
+
     @abstractmethod
     def create_user_from_update(self, update: Update) -> Response[bool]:
         """
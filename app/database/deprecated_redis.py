@@ -1,13 +1,23 @@
-import json
+import threading
+import time
+from collections import OrderedDict
 from dataclasses import dataclass
-from typing import Dict, Any, TypeVar, Generic
+from typing import Dict, Any, TypeVar, Generic, Optional
 
+import orjson
 import redis
 from loguru import logger
 from telegram import Update
 
-from app.constants.defaults import DEFAULT_NEW_USER
+from app.constants import DatabaseKeys
+from app.constants.defaults import (
+    DEFAULT_NEW_USER,
+    REDIS_MAX_CONNECTIONS,
+    REDIS_USER_CACHE_MAX_SIZE,
+    REDIS_USER_CACHE_TTL,
+)
 from app.startup import REDIS_PASSWORD, REDIS_HOST, REDIS_PORT, REDIS_DB_INDEX
+from app.database.utils import count_questions
 from app.utils import get_user_string
 from .abstraction import StorageProvider
 
@@ -38,6 +48,42 @@ def crud_request(func):
 
 T = TypeVar("T")
 
+# Collects every user hash on the server, as a flat list of key, [field, value, ...] pairs
+GET_USERS_SCRIPT = """
+local cursor = "0"
+local users = {}
+repeat
+    local result = redis.call("SCAN", cursor, "MATCH", "user:*", "COUNT", 500)
+    cursor = result[1]
+    for _, key in ipairs(result[2]) do
+        table.insert(users, key)
+        table.insert(users, redis.call("HGETALL", key))
+    end
+until cursor == "0"
+return users
+"""
+
+# Reads a user hash, creating it from ARGV (alternating fields and values) if it does
+# not exist; returns {1, ARGV} if the user was created and {0, fields} otherwise
+GET_OR_CREATE_USER_SCRIPT = """
+local user = redis.call("HGETALL", KEYS[1])
+if #user == 0 then
+    redis.call("HSET", KEYS[1], unpack(ARGV))
+    return {1, ARGV}
+end
+return {0, user}
+"""
+
+# Sets fields of an existing user hash from ARGV (alternating fields and values);
+# returns 0 without creating the hash if the user does not exist and 1 otherwise
+PATCH_USER_SCRIPT = """
+if redis.call("EXISTS", KEYS[1]) == 0 then
+    return 0
+end
+redis.call("HSET", KEYS[1], unpack(ARGV))
+return 1
+"""
+
 
 @dataclass
 class RedisResponse(Generic[T]):
@@ -68,6 +114,35 @@ def wrap_response(response: Any) -> RedisResponse[Any]:
     return RedisResponse(success=True, data=response)
 
 
+def encode_fields(fields: dict) -> Dict[str, bytes]:
+    """
+    Serialize the values of a user hash.
+
+    Args:
+        fields: A dictionary mapping field names to their values.
+
+    Returns:
+        A dictionary mapping field names to their JSON-encoded values.
+    """
+    return {k: orjson.dumps(v) for k, v in fields.items()}
+
+
+def decode_fields(fields: Dict[bytes, bytes]) -> dict:
+    """
+    Deserialize a user hash read from Redis.
+
+    Values written with the standard json module are valid JSON too, so
+    hashes stored before the switch to orjson are read the same way.
+
+    Args:
+        fields: A dictionary mapping raw field names to their raw values.
+
+    Returns:
+        A dictionary mapping field names to their values.
+    """
+    return {k.decode(): orjson.loads(v) for k, v in fields.items()}
+
+
 # TODO: rewrite whole class to use async and newer version features of redis-py
 class RedisCache(StorageProvider):
     """
@@ -82,14 +157,86 @@ class RedisCache(StorageProvider):
     """
 
     redis_client: redis.Redis = None
+    connection_pool: redis.ConnectionPool = None
+    get_users_script = None
+    get_or_create_user_script = None
+    patch_user_script = None
+    user_cache: OrderedDict = None
+    user_cache_lock: threading.Lock = None
 
     def on_created(self):
         logger.debug(
             f"Connecting to Redis at {REDIS_HOST}:{REDIS_PORT} with password {REDIS_PASSWORD[:3]}...{REDIS_PASSWORD[-3:]}"
         )
-        self.redis_client = redis.Redis(
-            host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB_INDEX, password=REDIS_PASSWORD
+        # Calls come from the worker threads of asyncio.to_thread, so connections are
+        # capped to their number and threads wait for a free one rather than failing
+        self.connection_pool = redis.BlockingConnectionPool(
+            host=REDIS_HOST,
+            port=REDIS_PORT,
+            db=REDIS_DB_INDEX,
+            password=REDIS_PASSWORD,
+            max_connections=REDIS_MAX_CONNECTIONS,
         )
+        self.redis_client = redis.Redis(connection_pool=self.connection_pool)
+        self.get_users_script = self.redis_client.register_script(GET_USERS_SCRIPT)
+        self.get_or_create_user_script = self.redis_client.register_script(
+            GET_OR_CREATE_USER_SCRIPT
+        )
+        self.patch_user_script = self.redis_client.register_script(PATCH_USER_SCRIPT)
+
+        # Recently read users by ID, as (expiry time, user data) pairs in LRU order;
+        # the instance is shared by worker threads, so access goes through a lock
+        self.user_cache = OrderedDict()
+        self.user_cache_lock = threading.Lock()
+
+    def get_cached_user(self, user_id: int | str) -> Optional[dict]:
+        """
+        Get a user from the in-process cache.
+
+        Args:
+            user_id: The ID of the user.
+
+        Returns:
+            A shallow copy of the user data or None if it is not cached or has expired.
+        """
+        key = str(user_id)
+        with self.user_cache_lock:
+            entry = self.user_cache.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self.user_cache[key]
+                return None
+            self.user_cache.move_to_end(key)
+            return dict(entry[1])
+
+    def cache_user(self, user_id: int | str, user_data: dict) -> None:
+        """
+        Put a user into the in-process cache, evicting the least recently used one if it is full.
+
+        Args:
+            user_id: The ID of the user.
+            user_data: The user data dictionary.
+        """
+        key = str(user_id)
+        with self.user_cache_lock:
+            self.user_cache[key] = (
+                time.monotonic() + REDIS_USER_CACHE_TTL,
+                dict(user_data),
+            )
+            self.user_cache.move_to_end(key)
+            if len(self.user_cache) > REDIS_USER_CACHE_MAX_SIZE:
+                self.user_cache.popitem(last=False)
+
+    def forget_user(self, user_id: int | str) -> None:
+        """
+        Drop a user from the in-process cache after it has been changed.
+
+        Args:
+            user_id: The ID of the user.
+        """
+        with self.user_cache_lock:
+            self.user_cache.pop(str(user_id), None)
 
     @crud_request
     def get_users(self) -> RedisResponse[Dict[str, Dict]]:
@@ -100,13 +247,14 @@ class RedisCache(StorageProvider):
             A dictionary mapping user IDs to user data dictionaries.
         """
         logger.debug("REDIS: Getting users")
+
+        # The script scans and reads all hashes server-side in a single round-trip
+        result = self.get_users_script()
+
         users = {}
-        for key in self.redis_client.scan_iter(match="user:*"):
+        for key, fields in zip(result[::2], result[1::2]):
             user_id = key.decode().split(":")[1]
-            user_data = self.redis_client.hgetall(key)
-            users[user_id] = {
-                k.decode(): json.loads(v.decode()) for k, v in user_data.items()
-            }
+            users[user_id] = decode_fields(dict(zip(fields[::2], fields[1::2])))
         return wrap_response(users)
 
     @crud_request
@@ -124,11 +272,10 @@ class RedisCache(StorageProvider):
         try:
             with self.redis_client.pipeline() as pipe:
                 for user_id, user_data in users.items():
-                    pipe.hmset(
-                        f"user:{user_id}",
-                        {k: json.dumps(v) for k, v in user_data.items()},
-                    )
+                    pipe.hset(f"user:{user_id}", mapping=encode_fields(user_data))
                 pipe.execute()
+            for user_id in users:
+                self.forget_user(user_id)
             return wrap_response(True)
         except Exception as e:
             logger.error(f"REDIS: Failed to update users: {e}")
@@ -148,9 +295,8 @@ class RedisCache(StorageProvider):
         """
         logger.debug(f"REDIS: Updating user with ID {user_id}")
         try:
-            self.redis_client.hmset(
-                f"user:{user_id}", {k: json.dumps(v) for k, v in user_data.items()}
-            )
+            self.redis_client.hset(f"user:{user_id}", mapping=encode_fields(user_data))
+            self.forget_user(user_id)
             return wrap_response(True)
         except Exception as e:
             logger.error(f"REDIS: Failed to update user {user_id}: {e}")
@@ -175,9 +321,8 @@ class RedisCache(StorageProvider):
 
         logger.debug(f"REDIS: Updating user with ID {user_id}")
         try:
-            self.redis_client.hmset(
-                f"user:{user_id}", {k: json.dumps(v) for k, v in user_data.items()}
-            )
+            self.redis_client.hset(f"user:{user_id}", mapping=encode_fields(user_data))
+            self.forget_user(user_id)
             return wrap_response(True)
         except Exception as e:
             logger.error(f"REDIS: Failed to update user {user_id}: {e}")
@@ -194,12 +339,17 @@ class RedisCache(StorageProvider):
         Returns:
             A dictionary containing the user data for the specified user ID.
         """
+        user_data = self.get_cached_user(user_id)
+        if user_data is not None:
+            return wrap_response(user_data)
+
         user_data_raw = self.redis_client.hgetall(f"user:{user_id}")
         if not user_data_raw:
             return wrap_response({})
-        return wrap_response(
-            {k.decode(): json.loads(v.decode()) for k, v in user_data_raw.items()}
-        )
+
+        user_data = decode_fields(user_data_raw)
+        self.cache_user(user_id, user_data)
+        return wrap_response(user_data)
 
     @crud_request
     def get_user(self, user_id: int) -> RedisResponse[dict]:
@@ -231,10 +381,23 @@ class RedisCache(StorageProvider):
         """
         logger.debug(f"REDIS: Getting user with ID {update.effective_user.id}")
         user_id = update.effective_user.id
-        user_data = self._get_user_by_id(user_id)
-        if not user_data:
-            self.create_user_from_update(update)
-            user_data = self._get_user_by_id(user_id)
+        user_data = self.get_cached_user(user_id)
+        if user_data is not None:
+            return wrap_response(user_data)
+
+        # Reading the user and creating it if it is missing is a single atomic call
+        new_user = {**update.effective_user.to_dict(), **DEFAULT_NEW_USER}
+        arguments = [
+            item for field in encode_fields(new_user).items() for item in field
+        ]
+        created, fields = self.get_or_create_user_script(
+            keys=[f"user:{user_id}"], args=arguments
+        )
+        if created:
+            logger.info(f"REDIS: Created new user {get_user_string(update)}")
+
+        user_data = decode_fields(dict(zip(fields[::2], fields[1::2])))
+        self.cache_user(user_id, user_data)
         return wrap_response(user_data)
 
     @crud_request
@@ -251,11 +414,109 @@ class RedisCache(StorageProvider):
         logger.debug(f"REDIS: Deleting user with ID {user_id}")
         try:
             self.redis_client.delete(f"user:{user_id}")
+            self.forget_user(user_id)
             return wrap_response(True)
         except Exception as e:
             logger.error(f"REDIS: Failed to delete user {user_id}: {e}")
             return wrap_response(False)
 
+    @crud_request
+    def patch_user(self, user_id: int, fields: dict) -> RedisResponse[bool]:
+        """
+        Update some fields of an existing user's hash.
+
+        The existence check and the HSET run in one script, so a missing user is
+        not recreated as a partial hash.
+
+        Args:
+            user_id: The ID of the user to update.
+            fields: A dictionary mapping the keys of the fields to update to their new values.
+
+        Returns:
+            A boolean indicating if the update was successful, False if the user does not exist.
+        """
+        logger.debug(f"REDIS: Updating {', '.join(fields)} of user with ID {user_id}")
+        try:
+            arguments = [item for field in encode_fields(fields).items() for item in field]
+            updated = self.patch_user_script(keys=[f"user:{user_id}"], args=arguments)
+            self.forget_user(user_id)
+            if not updated:
+                logger.warning(f"REDIS: User with ID {user_id} not found")
+            return wrap_response(bool(updated))
+        except Exception as e:
+            logger.error(f"REDIS: Failed to update user {user_id}: {e}")
+            return wrap_response(False)
+
+    @crud_request
+    def append_exchange(self, user_id: int, messages: list) -> RedisResponse[bool]:
+        """
+        Append messages to a user's conversation and count one more question.
+
+        The hash is watched while it is read, so the update is retried instead of
+        being written over a change made by another client in the meantime.
+
+        Args:
+            user_id: The ID of the user to update.
+            messages: The question and the answer to append to the conversation.
+
+        Returns:
+            A boolean indicating if the update was successful.
+        """
+        logger.debug(f"REDIS: Appending to the conversation of user with ID {user_id}")
+        key = f"user:{user_id}"
+
+        def append(pipe: redis.client.Pipeline) -> bool:
+            if not pipe.exists(key):
+                return False
+
+            conversation, questions_count = (
+                orjson.loads(value) if value is not None else None
+                for value in pipe.hmget(
+                    key,
+                    DatabaseKeys.User.CONVERSATION,
+                    DatabaseKeys.User.QUESTIONS_COUNT,
+                )
+            )
+            conversation = conversation or []
+            questions_count = count_questions(
+                {
+                    DatabaseKeys.User.CONVERSATION: conversation,
+                    DatabaseKeys.User.QUESTIONS_COUNT: questions_count,
+                }
+            )
+
+            pipe.multi()
+            pipe.hset(
+                key,
+                mapping=encode_fields(
+                    {
+                        DatabaseKeys.User.CONVERSATION: [*conversation, *messages],
+                        DatabaseKeys.User.QUESTIONS_COUNT: questions_count + 1,
+                    }
+                ),
+            )
+            return True
+
+        try:
+            appended = self.redis_client.transaction(append, key, value_from_callable=True)
+            self.forget_user(user_id)
+            return wrap_response(appended)
+        except Exception as e:
+            logger.error(f"REDIS: Failed to update user {user_id}: {e}")
+            return wrap_response(False)
+
+    def clear_conversation(self, user_id: int) -> RedisResponse[bool]:
+        """
+        Clear the conversation history of a user.
+
+        Args:
+            user_id: The ID of the user whose conversation should be cleared.
+
+        Returns:
+            A boolean indicating if the conversation was cleared.
+        """
+        return self.patch_user(user_id, {DatabaseKeys.User.CONVERSATION: []})
+
     @crud_request
     def create_user_from_update(self, update: Update) -> RedisResponse[bool]:
         """
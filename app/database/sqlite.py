@@ -1,20 +1,58 @@
-from typing import Dict, Optional
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
 
 from loguru import logger
 from telegram import Update
 
-from app.database.utils import gather_user_data
+from app.constants import DatabaseKeys
+from app.database.utils import count_questions, gather_user_data
 from app.database.abstraction import StorageProvider, Response
 from app.startup import DATABASE_CONFIG
 
+import ast
+import queue
 import sqlite3
+import threading
+
+import orjson
+
+DEFAULT_POOL_SIZE = 4
+
+
+def dump_user_data(user_data: dict) -> str:
+    """Serialize user data for the `user_data` column."""
+    return orjson.dumps(user_data, option=orjson.OPT_NON_STR_KEYS).decode()
+
+
+def load_user_data(raw: str) -> dict:
+    """Deserialize the `user_data` column, including rows stored as Python literals."""
+    try:
+        return orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        return ast.literal_eval(raw)
 
 
 class SqliteDatabase(StorageProvider):
     def on_created(self):
         """Create the users table if it doesn't exist."""
         self.db_path: str = DATABASE_CONFIG.get("path")
-        with sqlite3.connect(self.db_path) as conn:
+        # A single long-lived connection is used for writes instead of opening
+        # a new one for every query. Handlers call the provider from worker
+        # threads, so access to it is serialized.
+        self.connection = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.lock = threading.Lock()
+
+        # With WAL, readers don't block the writer or each other, so reads are
+        # served from a small pool of connections.
+        self.readers: queue.Queue = queue.Queue()
+        if self.db_path != ":memory:":
+            for _ in range(DATABASE_CONFIG.get("pool_size", DEFAULT_POOL_SIZE)):
+                self.readers.put(
+                    sqlite3.connect(self.db_path, check_same_thread=False)
+                )
+
+        with self.lock, self.connection as conn:
             cursor = conn.cursor()
             cursor.execute(
                 """
@@ -28,9 +66,23 @@ class SqliteDatabase(StorageProvider):
             conn.commit()
         logger.info(f"Database created successfully at {self.db_path}")
 
+    @contextmanager
+    def reader(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a read connection from the pool, or the write connection if there is none."""
+        if self.db_path == ":memory:":
+            with self.lock:
+                yield self.connection
+            return
+
+        conn = self.readers.get()
+        try:
+            yield conn
+        finally:
+            self.readers.put(conn)
+
     def get_data(self):
         """Retrieve all user data."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.reader() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT * FROM users")
             rows = cursor.fetchall()
@@ -40,14 +92,14 @@ class SqliteDatabase(StorageProvider):
     def update_users(self, users: Dict[str, dict]) -> Response[bool]:
         """Update multiple users."""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.lock, self.connection as conn:
                 cursor = conn.cursor()
                 for user_id, user_data in users.items():
                     cursor.execute(
                         """
                         INSERT OR REPLACE INTO users (user_id, user_data) VALUES (?, ?)
                     """,
-                        (user_id, str(user_data)),
+                        (user_id, dump_user_data(user_data)),
                     )
                 conn.commit()
             logger.info("Updated multiple users successfully")
@@ -63,13 +115,13 @@ class SqliteDatabase(StorageProvider):
                 logger.error(f"Invalid user ID type: {type(user_id)}")
                 raise ValueError("Invalid user ID type")
 
-            with sqlite3.connect(self.db_path) as conn:
+            with self.lock, self.connection as conn:
                 cursor = conn.cursor()
                 cursor.execute(
                     """
                     INSERT OR REPLACE INTO users (user_id, user_data) VALUES (?, ?)
                 """,
-                    (user_id, str(user_data)),
+                    (user_id, dump_user_data(user_data)),
                 )
                 conn.commit()
             logger.info(f"Updated user with ID {user_id} successfully")
@@ -96,7 +148,7 @@ class SqliteDatabase(StorageProvider):
 
     def _get_user_by_id(self, user_id: int) -> Optional[dict]:
         """Retrieve a user by their ID (internal method)."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.reader() as conn:
             cursor = conn.cursor()
             cursor.execute(
                 """
@@ -106,7 +158,7 @@ class SqliteDatabase(StorageProvider):
             )
             row = cursor.fetchone()
             if row:
-                return eval(row[0])
+                return load_user_data(row[0])
             return None
 
     def get_user(self, user_id: int) -> Response[dict]:
@@ -138,10 +190,78 @@ class SqliteDatabase(StorageProvider):
         except Exception as e:
             return Response(success=False, data=str(e))
 
+    def patch_user(self, user_id: int, fields: dict) -> Response[bool]:
+        """Update some fields of a user by their ID in a single transaction."""
+        try:
+            with self.lock, self.connection as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    """
+                    SELECT user_data FROM users WHERE user_id = ?
+                """,
+                    (user_id,),
+                )
+                row = cursor.fetchone()
+                if not row:
+                    logger.error(f"User with ID {user_id} not found")
+                    return Response(success=False, data="User not found")
+
+                user_data = load_user_data(row[0])
+                user_data.update(fields)
+                cursor.execute(
+                    """
+                    UPDATE users SET user_data = ? WHERE user_id = ?
+                """,
+                    (dump_user_data(user_data), user_id),
+                )
+            logger.info(f"Updated {', '.join(fields)} of user with ID {user_id} successfully")
+            return Response(success=True, data=True)
+        except Exception as e:
+            logger.error(f"Error updating {', '.join(fields)} of user with ID {user_id}: {e}")
+            return Response(success=False, data=str(e))
+
+    def append_exchange(self, user_id: int, messages: list) -> Response[bool]:
+        """Append messages to the conversation of a user and count the question in a single transaction."""
+        try:
+            with self.lock, self.connection as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    """
+                    SELECT user_data FROM users WHERE user_id = ?
+                """,
+                    (user_id,),
+                )
+                row = cursor.fetchone()
+                if not row:
+                    logger.error(f"User with ID {user_id} not found")
+                    return Response(success=False, data="User not found")
+
+                user_data = load_user_data(row[0])
+                user_data[DatabaseKeys.User.QUESTIONS_COUNT] = count_questions(user_data) + 1
+                user_data[DatabaseKeys.User.CONVERSATION] = [
+                    *user_data.get(DatabaseKeys.User.CONVERSATION, []),
+                    *messages,
+                ]
+                cursor.execute(
+                    """
+                    UPDATE users SET user_data = ? WHERE user_id = ?
+                """,
+                    (dump_user_data(user_data), user_id),
+                )
+            logger.info(f"Appended to the conversation of user with ID {user_id} successfully")
+            return Response(success=True, data=True)
+        except Exception as e:
+            logger.error(f"Error appending to the conversation of user with ID {user_id}: {e}")
+            return Response(success=False, data=str(e))
+
+    def clear_conversation(self, user_id: int) -> Response[bool]:
+        """Clear the conversation of a user by their ID."""
+        return self.patch_user(user_id, {DatabaseKeys.User.CONVERSATION: []})
+
     def delete_user(self, user_id: int) -> Response[bool]:
         """Delete a user by their ID."""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.lock, self.connection as conn:
                 cursor = conn.cursor()
                 cursor.execute(
                     """
@@ -157,11 +277,67 @@ class SqliteDatabase(StorageProvider):
     def get_users(self) -> Response[Dict[str, Dict]]:
         """Retrieve all users."""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.reader() as conn:
                 cursor = conn.cursor()
                 cursor.execute("SELECT user_id, user_data FROM users")
                 rows = cursor.fetchall()
-                users = {str(row[0]): eval(row[1]) for row in rows}
+                users = {str(row[0]): load_user_data(row[1]) for row in rows}
             return Response(success=True, data=users)
         except Exception as e:
             return Response(success=False, data=str(e))
+
+
+if __name__ == "__main__":
+    from concurrent.futures import ThreadPoolExecutor
+
+    DATABASE_CONFIG["path"] = ":memory:"
+    database = SqliteDatabase()
+
+    CONVERSATION = DatabaseKeys.User.CONVERSATION
+    QUESTIONS_COUNT = DatabaseKeys.User.QUESTIONS_COUNT
+    CHOSEN_MODEL = DatabaseKeys.User.CHOSEN_MODEL
+
+    def exchange(number: int) -> list:
+        return [
+            {"role": "user", "content": f"question {number}"},
+            {"role": "assistant", "content": f"answer {number}"},
+        ]
+
+    # Missing users are not created by partial updates
+    assert not database.patch_user(1, {CHOSEN_MODEL: "model"}).success
+    assert not database.clear_conversation(1).success
+    assert not database.append_exchange(1, exchange(0)).success
+    assert not database.get_user(1).success
+
+    database.update_user_by_id(
+        1,
+        {
+            DatabaseKeys.User.ID: 1,
+            CONVERSATION: [],
+            QUESTIONS_COUNT: 0,
+            CHOSEN_MODEL: "a",
+        },
+    )
+
+    # Patching a field keeps the others
+    assert database.patch_user(1, {CHOSEN_MODEL: "b"}).success
+    user = database.get_user(1).data
+    assert user[CHOSEN_MODEL] == "b" and user[CONVERSATION] == []
+
+    # Exchanges saved at the same time are all kept and counted
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(
+            executor.map(lambda n: database.append_exchange(1, exchange(n)), range(16))
+        )
+    assert all(result.success for result in results)
+    user = database.get_user(1).data
+    assert user[QUESTIONS_COUNT] == 16
+    assert len(user[CONVERSATION]) == 32
+    assert user[CHOSEN_MODEL] == "b"
+
+    # A reset stays in effect, the old conversation doesn't come back with the next exchange
+    assert database.clear_conversation(1).success
+    assert database.append_exchange(1, exchange(16)).success
+    user = database.get_user(1).data
+    assert user[CONVERSATION] == exchange(16)
+    assert user[QUESTIONS_COUNT] == 17
@@ -1,3 +1,5 @@
+import asyncio
+
 from telegram import Update
 from app.constants import AccessLevel, DatabaseKeys
 from app.constants.defaults import DEFAULT_NEW_USER
@@ -18,3 +20,42 @@ def gather_user_data(update: Update) -> dict:
     except Exception as e:
         logger.error(f"Error gathering user data: {e}")
         return None, None
+
+
+def count_questions(user_data: dict) -> int:
+    """
+    Get the number of questions a user has asked.
+
+    Records created before the counter was stored fall back to counting
+    the user messages of the conversation.
+    """
+    questions_count = user_data.get(DatabaseKeys.User.QUESTIONS_COUNT)
+    if questions_count is None:
+        questions_count = sum(
+            1
+            for message in user_data.get(DatabaseKeys.User.CONVERSATION, [])
+            if message.get("role") == "user"
+        )
+    return questions_count
+
+
+async def save_exchange(database, user: dict, messages: list, answer: dict) -> None:
+    """
+    Append a question and its answer to a user's stored conversation.
+
+    The storage provider appends the exchange to the conversation as it is stored
+    when the answer is ready, not to the one the answer was generated from. So
+    when answers to one user are generated at the same time, every exchange is
+    kept and counted as a question. A reset made in the meantime stays in effect,
+    and the cleared conversation only gets the new exchange. Other fields of the
+    user are not written.
+
+    Args:
+        database: The storage provider to write the exchange to.
+        user: The user data dictionary the answer was generated for.
+        messages: The conversation sent to the model, ending with the new question.
+        answer: The assistant message answering the question.
+    """
+    await asyncio.to_thread(
+        database.append_exchange, user[DatabaseKeys.User.ID], [messages[-1], answer]
+    )
@@ -23,6 +23,8 @@ class DictionarySerializable(ABC):
         from_dict: Convert a dictionary to a message object.
     """
 
+    __slots__ = ()
+
     def __init__(self, **kwargs):
         for key, value in kwargs.items():
             if key not in self.__annotations__:
@@ -176,11 +178,21 @@ class Model(DictionarySerializable):
         is_active: Whether the model is active or not.
     """
 
+    __slots__ = ('name', 'description', 'min_access_level', 'is_active', 'temperature')
+
     name: str
-    description: str = ''
+    description: str
     min_access_level: int
-    is_active: bool = True
-    temperature: float = 1.0
+    is_active: bool
+    temperature: float
+
+    def __init__(self, **kwargs):
+        # Slotted attributes can't have class-level defaults, so they are set here
+        self.description = ''
+        self.is_active = True
+        self.temperature = 1.0
+
+        super().__init__(**kwargs)
 
     def to_dict(self) -> dict[str, Any]:
         return {
@@ -5,6 +5,7 @@ from app.model.abstraction import ChatProvider
 from app.constants import DatabaseKeys
 from app.constants.defaults import DEFAULT_MODEL
 from app.database import Database
+from app.database.utils import save_exchange
 from app.dto import User
 from g4f.client import Client
 from g4f.Provider import HuggingChat, You
@@ -25,6 +26,7 @@ class GPT4FreeProvider(ChatProvider):
         self.success_responses_count = 0
         self.total_responses_count = 0
         self.client = Client()
+        self.database = Database()
 
     async def create_answer(self, message: str, user: dict | User) -> str:
         if isinstance(user, User):
@@ -45,12 +47,7 @@ class GPT4FreeProvider(ChatProvider):
         print(response.choices[0].message.content)
 
         answer = response["message"]
-        user["conversation"] = [*messages, answer]
-
-        Database().update_user_by_id(
-            user_id=user.get(DatabaseKeys.User.ID),
-            user_data=user,
-        )
+        await save_exchange(self.database, user, messages, answer)
 
         return answer["content"].strip()
 
@@ -80,12 +77,7 @@ class GPT4FreeProvider(ChatProvider):
             yield data
 
         answer = {"role": "assistant", "content": full_response}
-        user["conversation"] = [*messages, answer]
-
-        Database().update_user_by_id(
-            user_id=user[DatabaseKeys.User.ID],
-            user_data=user,
-        )
+        await save_exchange(self.database, user, messages, answer)
 
     def stability_percentage(self) -> float:
         if self.total_responses_count == 0:
@@ -4,9 +4,10 @@ from typing import AsyncGenerator, TypeVar
 from app.constants.defaults import DEFAULT_MODEL
 from app.constants import DatabaseKeys
 from app.database import Database
+from app.database.utils import save_exchange
 from app.dto import User
 from app.model.abstraction import ChatProvider
-import ollama
+from ollama import AsyncClient
 
 T = TypeVar("T")
 
@@ -23,6 +24,10 @@ class OllamaProvider(ChatProvider):
         self.error_responses_count = 0
         self.success_responses_count = 0
         self.total_responses_count = 0
+        # One client for the provider's lifetime, so HTTP connections are kept alive
+        # between requests and streaming does not block the event loop
+        self.client = AsyncClient()
+        self.database = Database()
 
     async def create_answer(self, message: str, user: dict | User) -> str:
         if isinstance(user, User):
@@ -37,19 +42,14 @@ class OllamaProvider(ChatProvider):
 
         self.total_responses_count += 1
 
-        response = ollama.chat(
+        response = await self.client.chat(
             model=user.get(DatabaseKeys.User.CHOSEN_MODEL, DEFAULT_MODEL.name),
             messages=messages,
             stream=False,
         )
 
         answer = response["message"]
-        user["conversation"] = [*messages, answer]
-
-        Database().update_user_by_id(
-            user_id=user.get(DatabaseKeys.User.ID),
-            user_data=user,
-        )
+        await save_exchange(self.database, user, messages, answer)
 
         return answer["content"].strip()
 
@@ -66,7 +66,7 @@ class OllamaProvider(ChatProvider):
         self.total_responses_count += 1
 
         full_response = ""
-        for chunk in ollama.chat(
+        async for chunk in await self.client.chat(
             model=user.get(DatabaseKeys.User.CHOSEN_MODEL, DEFAULT_MODEL.name),
             messages=messages,
             stream=True,
@@ -76,12 +76,7 @@ class OllamaProvider(ChatProvider):
                 yield chunk["message"]["content"]
 
         answer = {"role": "assistant", "content": full_response}
-        user["conversation"] = [*messages, answer]
-
-        Database().update_user_by_id(
-            user_id=user[DatabaseKeys.User.ID],
-            user_data=user,
-        )
+        await save_exchange(self.database, user, messages, answer)
 
     def stability_percentage(self) -> float:
         if self.total_responses_count == 0:
@@ -11,6 +11,7 @@ from app.constants.strings import (
     MSG_ERROR_MODEL_OPENAI_ERROR,
 )
 from app.database import Database
+from app.database.utils import save_exchange
 from app.dto import User
 from app.model.abstraction import ChatProvider
 from app.startup import OPENAI_TOKEN
@@ -110,6 +111,7 @@ class OpenAIModels(ChatProvider):
         self.error_responses_count = 0
         self.success_responses_count = 0
         self.total_responses_count = 0
+        self.database = Database()
 
     async def create_answer(self, message: str, user: dict | User) -> str:
         """
@@ -169,9 +171,9 @@ class OpenAIModels(ChatProvider):
                 + f"\n\nУровень стабильности: {self.stability_percentage:.2f}%"
             )
 
-        user["conversation"] = [*messages, {"role": "assistant", "content": answer}]
-
-        Database().update_user_by_id(user)
+        await save_exchange(
+            self.database, user, messages, {"role": "assistant", "content": answer}
+        )
 
         return answer
 
@@ -13,15 +13,26 @@ CONFIG_TEMPLATE = """
 [global]
 maintenance_mode = false
 telegram_bot_token = { env = "TELEGRAM_BOT_TOKEN" }
+max_concurrent_updates = 50
+drop_pending_updates = false
 
 [models]
 # openai_api_key = { env = "OPENAI_API_KEY" }
 # ollama_api_url = { env = "OLLAMA_API_URL" } # TODO
+max_concurrent_requests = 2
 
 [database]
 provider = "sqlite"
 path = "sqlite.db"
 
+# Uncomment to receive updates through a webhook instead of polling
+# [webhook]
+# url = "https://example.com/telegram"
+# listen = "0.0.0.0"
+# port = 8080
+# path = "telegram"
+# secret_token = { env = "WEBHOOK_SECRET_TOKEN" }
+
 # Uncomment and configure the database you want to use
 # [database]
 # type = "mongodb"
@@ -94,6 +105,21 @@ def load_environment_variables(raw_config: Dict[str, Any]) -> Dict[str, Any]:
     return env_vars
 
 
+def to_bool(value: Any) -> bool:
+    """
+    Convert a configuration value to a real boolean.
+
+    Strings such as "true", "1", "yes" or "on" are treated as True, other
+    strings as False, so values coming from environment variables are not
+    truthy just because they are non-empty.
+    """
+    if isinstance(value, str):
+        return value.strip().lower() in ("true", "1", "yes", "on")
+    if isinstance(value, (bool, int)):
+        return bool(value)
+    return False
+
+
 def validate_config(config: Dict[str, Any]) -> None:
     if not config["TELEGRAM_BOT_TOKEN"]:
         logger.critical("Telegram bot token is not set!")
@@ -111,8 +137,32 @@ __RAW_CONFIG = load_config()
 ENVIRONMENT_VARIABLES = load_environment_variables(__RAW_CONFIG)
 
 # Global settings
-MAINTENANCE_MODE = __RAW_CONFIG.get("global", {}).get("maintenance_mode", False)
+MAINTENANCE_MODE = to_bool(
+    ENVIRONMENT_VARIABLES.get(
+        "maintenance_mode",
+        __RAW_CONFIG.get("global", {}).get("maintenance_mode", False),
+    )
+)
 TELEGRAM_BOT_TOKEN = ENVIRONMENT_VARIABLES.get(ENV_TELEGRAM_BOT_TOKEN)
+BOT_MAX_CONCURRENT_UPDATES = int(
+    __RAW_CONFIG.get("global", {}).get("max_concurrent_updates", 50)
+)
+DROP_PENDING_UPDATES = to_bool(
+    __RAW_CONFIG.get("global", {}).get("drop_pending_updates", False)
+)
+
+# Model settings
+MODEL_MAX_CONCURRENT_REQUESTS = int(
+    __RAW_CONFIG.get("models", {}).get("max_concurrent_requests", 2)
+)
+
+# Webhook settings, the bot polls for updates if no URL is set
+WEBHOOK_CONFIG: Dict[str, Any] = __RAW_CONFIG.get("webhook", {})
+WEBHOOK_URL = WEBHOOK_CONFIG.get("url")
+WEBHOOK_LISTEN = WEBHOOK_CONFIG.get("listen", "0.0.0.0")
+WEBHOOK_PORT = int(WEBHOOK_CONFIG.get("port", 8080))
+WEBHOOK_PATH = WEBHOOK_CONFIG.get("path", "")
+WEBHOOK_SECRET_TOKEN = ENVIRONMENT_VARIABLES.get("secret_token")
 
 # Database settings
 DATABASE_CONFIG: Dict[str, Any] = __RAW_CONFIG.get("database", {})
@@ -1,4 +1,8 @@
-from typing import final
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache, wraps
+from typing import Callable, final
 
 from loguru import logger
 from telegram import Update
@@ -49,6 +53,60 @@ class Singleton:
 
 
 
+def ttl_cache(ttl: float, maxsize: int = 128) -> Callable:
+    """
+    Decorator for caching function results by positional arguments for `ttl` seconds.
+
+    The least recently used entry is evicted when the cache grows over `maxsize`.
+    The decorated function gets a `cache_clear` method for explicit invalidation.
+    The cache is safe to use from several threads.
+
+    Args:
+        ttl: Time in seconds for which a cached result stays valid.
+        maxsize: Maximum number of cached results.
+
+    Returns:
+        A decorator function.
+    """
+
+    def decorator(func: Callable) -> Callable:
+        cache: OrderedDict = OrderedDict()
+        lock = threading.Lock()
+        # Bumped by every clear, so a result computed before it is not stored
+        generation = 0
+
+        @wraps(func)
+        def wrapper(*args):
+            now = time.monotonic()
+            with lock:
+                entry = cache.get(args)
+                if entry is not None and entry[0] > now:
+                    cache.move_to_end(args)
+                    return entry[1]
+                started_generation = generation
+
+            result = func(*args)
+            with lock:
+                if generation != started_generation:
+                    return result
+                cache[args] = (now + ttl, result)
+                cache.move_to_end(args)
+                if len(cache) > maxsize:
+                    cache.popitem(last=False)
+            return result
+
+        def cache_clear():
+            nonlocal generation
+            with lock:
+                generation += 1
+                cache.clear()
+
+        wrapper.cache_clear = cache_clear
+        return wrapper
+
+    return decorator
+
+
 def get_user_string(update: Update) -> str:
     """
     Get a string representation of a user.
@@ -61,7 +119,35 @@ def get_user_string(update: Update) -> str:
     Returns:
         A string representation of the user.
     """
-    return f"\"{update.effective_user.first_name} {update.effective_user.username}\" (ID{update.effective_user.id})"
+    user = update.effective_user
+    return _format_user_string(user.first_name, user.username, user.id)
+
+
+@lru_cache(maxsize=1024)
+def _format_user_string(first_name: str, username: str, user_id: int) -> str:
+    """
+    Format and memoize the string representation of a user.
+
+    Telegram objects are immutable, so the result is cached by the user fields
+    instead of being stored on the update itself.
+    """
+    return f"\"{first_name} {username}\" (ID{user_id})"
+
+
+def log_user_action(update: Update, action: str) -> None:
+    """
+    Log on debug level that a user performed an action.
+
+    The user string is built lazily, so nothing is formatted when debug
+    logging is disabled.
+
+    Args:
+        update: The update to get the user from.
+        action: Description of the action, e.g. "/start command".
+    """
+    logger.opt(lazy=True, depth=1).debug(
+        "User {} used {}", lambda: get_user_string(update), lambda: action
+    )
 
 
 def get_id_from_update(update: Update) -> int:
@@ -77,6 +163,22 @@ def get_id_from_update(update: Update) -> int:
     return update.effective_user.id
 
 
+def parse_user_id(value: str) -> int:
+    """
+    Parse a user ID that may be given with an "ID" prefix, e.g. "ID123" or "123".
+
+    Args:
+        value: The string to parse.
+
+    Returns:
+        The user ID as an integer.
+
+    Raises:
+        ValueError: If the string is not a valid user ID.
+    """
+    return int(value.removeprefix("ID"))
+
+
 def get_user_name(update: Update) -> str:
     """
     Get the username of a user.
@@ -116,3 +218,36 @@ if __name__ == '__main__':
     assert s1 is s2 is s3
     assert type(s1) is type(s2) is type(s3) is testing_class
     assert s1.__dict__ == s2.__dict__ == s3.__dict__ == {'asd': 123, 'a': 1, 'b': 2, 'c': 3, 'created': True}
+
+    calls = []
+
+    @ttl_cache(ttl=0.05, maxsize=2)
+    def cached(value):
+        calls.append(value)
+        return value * 2
+
+    assert cached(1) == cached(1) == 2
+    assert calls == [1]
+
+    time.sleep(0.06)
+    assert cached(1) == 2
+    assert calls == [1, 1]
+
+    cached(2)
+    cached(3)
+    cached(1)
+    assert calls == [1, 1, 2, 3, 1]
+
+    cached.cache_clear()
+    cached(3)
+    assert calls == [1, 1, 2, 3, 1, 3]
+
+    @ttl_cache(ttl=60)
+    def cleared_meanwhile(value):
+        cleared_meanwhile.cache_clear()
+        calls.append(value)
+        return value
+
+    cleared_meanwhile(4)
+    cleared_meanwhile(4)
+    assert calls[-2:] == [4, 4]
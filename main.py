@@ -4,7 +4,7 @@ from loguru import logger
 if __name__ == "__main__":
     logger.info("Starting application")
     try:
-        application.run_polling()
+        application.run()
     except KeyboardInterrupt:
         logger.info("Ending process")
  
\ No newline at end of file